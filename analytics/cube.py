@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+# Dimensions of the AMR cube: one row per observed combination, with its row count
+CUBE_KEYS = [
+    'year_clean','hcf_id_clean','facility_clean','patienttype_clean',
+    'specimen_clean','pathogen_clean','antibiotic_clean','gender_clean','sir_clean'
+]
+
+
+def _cell_ids(df: pd.DataFrame, keys: list) -> np.ndarray:
+    """Cube cell number of every row (cells numbered in order of first appearance)."""
+    return df.groupby(keys, dropna=False, observed=True, sort=False).ngroup().to_numpy()
+
+
+def build_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate a cleaned frame to one row per observed CUBE_KEYS combination,
+    with the row count in 'n' and the cell number in 'cell' (missing keys are
+    kept as their own group). Built once per dataset; every row-count table of
+    the dashboard can be derived from it (analytics functions take weight='n').
+    """
+    keys = [c for c in CUBE_KEYS if c in df.columns]
+    if not keys:
+        return pd.DataFrame({'cell': [0], 'n': [len(df)]})
+    cells = _cell_ids(df, keys)
+    firsts = pd.Series(cells).drop_duplicates()
+    cube = df[keys].iloc[firsts.index[np.argsort(firsts.to_numpy())]].reset_index(drop=True)
+    cube['cell'] = np.arange(len(cube), dtype=np.int32)
+    cube['n'] = np.bincount(cells, minlength=len(cube))
+    return cube
+
+
+def build_patient_sets(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Patient set of every cube cell, as distinct (cell, patient_code) pairs sorted
+    by cell (patient_code: dense ints from data.pipeline.add_patient_codes).
+    Cell numbers match build_cube(df). None if the frame has no patient codes.
+    """
+    if 'patient_code' not in df.columns:
+        return None
+    keys = [c for c in CUBE_KEYS if c in df.columns]
+    cells = _cell_ids(df, keys) if keys else np.zeros(len(df), dtype=np.int64)
+    codes = df['patient_code'].to_numpy()
+    ok = codes >= 0
+    pairs = np.unique((cells[ok].astype(np.int64) << 32) | codes[ok].astype(np.int64))
+    return pd.DataFrame({'cell': (pairs >> 32).astype(np.int32),
+                         'patient_code': (pairs & 0xFFFFFFFF).astype(np.int32)})
+
+
+def cube_from_counts(counts: pd.DataFrame):
+    """
+    (cube, patients) as build_cube / build_patient_sets give them, from row counts
+    per CUBE_KEYS combination and patient_id_key (column 'n', e.g. the cube kept
+    by a cumulative store, see data/store.py), without the rows themselves.
+    """
+    keys = [c for c in CUBE_KEYS if c in counts.columns]
+    if not keys:
+        return pd.DataFrame({'cell': [0], 'n': [int(counts['n'].sum())]}), None
+    cells = _cell_ids(counts, keys)
+    firsts = pd.Series(cells).drop_duplicates()
+    cube = counts[keys].iloc[firsts.index[np.argsort(firsts.to_numpy())]].reset_index(drop=True)
+    cube['cell'] = np.arange(len(cube), dtype=np.int32)
+    cube['n'] = np.bincount(cells, weights=counts['n'].to_numpy(), minlength=len(cube)).astype(np.int64)
+    if 'patient_id_key' not in counts.columns:
+        return cube, None
+    codes = pd.factorize(counts['patient_id_key'])[0]
+    ok = codes >= 0
+    pairs = np.unique((cells[ok].astype(np.int64) << 32) | codes[ok].astype(np.int64))
+    return cube, pd.DataFrame({'cell': (pairs >> 32).astype(np.int32),
+                               'patient_code': (pairs & 0xFFFFFFFF).astype(np.int32)})
+
+
+def filter_cube(cube: pd.DataFrame, selections: dict) -> pd.DataFrame:
+    """Roll-up input for a filter selection ({column: [values]}, as in df_f.attrs['filters'])."""
+    mask = pd.Series(True, index=cube.index)
+    for col, values in (selections or {}).items():
+        if col in cube.columns:
+            mask &= cube[col].isin(values)
+    return cube[mask]
+
+
+def _selected_pairs(cube: pd.DataFrame, patients: pd.DataFrame, cell_group: np.ndarray = None):
+    """(group, patient_code) arrays of the patient pairs that belong to the given cube rows."""
+    n_cells = int(patients['cell'].max()) + 1 if len(patients) else 0
+    n_cells = max(n_cells, int(cube['cell'].max()) + 1 if len(cube) else 0)
+    group_of_cell = np.full(n_cells, -1, dtype=np.int64)
+    group_of_cell[cube['cell'].to_numpy()] = 0 if cell_group is None else cell_group
+    group = group_of_cell[patients['cell'].to_numpy()]
+    keep = group >= 0
+    return group[keep], patients['patient_code'].to_numpy()[keep]
+
+
+def count_patients(cube: pd.DataFrame, patients: pd.DataFrame) -> int:
+    """Exact number of distinct patients in the (filtered) cube rows."""
+    _, codes = _selected_pairs(cube, patients)
+    if not len(codes):
+        return 0
+    seen = np.zeros(int(codes.max()) + 1, dtype=bool)   # patient bitset, OR-ed over the cells
+    seen[codes] = True
+    return int(seen.sum())
+
+
+def patients_by(cube: pd.DataFrame, patients: pd.DataFrame, by: list) -> pd.Series:
+    """
+    Exact distinct patients per `by` group over the (filtered) cube rows: the
+    union of the cells' patient sets in each group. Same result (groups, order)
+    as rows.dropna(subset=by).groupby(by, observed=True)['patient_id_key'].nunique().
+    """
+    cube = cube.dropna(subset=by)
+    g = cube.groupby(by, observed=True)
+    groups = g.size().index
+    group, codes = _selected_pairs(cube, patients, g.ngroup().to_numpy())
+    distinct = pd.unique((group << 32) | codes.astype(np.int64)) >> 32
+    counts = np.bincount(distinct, minlength=len(groups)) if len(groups) else np.zeros(0, dtype=np.int64)
+    return pd.Series(counts, index=groups, name='patient_id_key')
@@ -1,27 +1,32 @@
 import numpy as np
 import pandas as pd
+from data.age import AGE_UNIT_YEARS, age_bands
+
+# Per-row / per-Series age helpers; cleaned frames already carry age_years,
+# age_band and age_band_5y (data/age.py), computed once at cleaning.
 
 def age_to_years_for_analysis(row) -> float:
     v, t = row.get('age_value'), row.get('age_type')
     if pd.isna(v) or pd.isna(t): return np.nan
-    t = str(t).lower()
-    if t == 'years':  return float(v)
-    if t == 'months': return float(v) / 12.0
-    if t == 'weeks':  return float(v) * 7.0 / 365.25
-    if t == 'days':   return float(v) / 365.25
-    if t == 'hours':  return float(v) / (24.0 * 365.25)
-    return np.nan
+    factor = AGE_UNIT_YEARS.get(str(t).capitalize())
+    return np.nan if factor is None else float(v) * factor
 
 def add_age_bands_years(s_years: pd.Series) -> pd.Series:
-    # Coerce to numeric; blanks/None/invalid -> NaN
-    s = pd.to_numeric(s_years, errors="coerce")
-
-    bins   = [-0.01, 1, 5, 15, 25, 45, 65, 120]
-    labels = ["<1y", "1–5y", "5–15y", "15–25y", "25–45y", "45–65y", "65+y"]
+    # blanks/None/invalid/out of range -> "Unknown"
+    return age_bands(s_years)
 
-    band = pd.cut(s, bins=bins, labels=labels, include_lowest=True)
 
-    # Add "Unknown" for NaN (null/blank/non-numeric)
-    band = band.cat.add_categories(["Unknown"]).fillna("Unknown")
-    return band
+def value_counts(s: pd.Series, weights: pd.Series = None, **kwargs) -> pd.Series:
+    """
+    value_counts without the zero-count rows a categorical column reports for
+    unobserved categories (e.g. values filtered away).
 
+    weights : per-row counts (e.g. the 'n' column of an aggregated cube); each
+              row then counts `weights` times instead of once.
+    """
+    if weights is not None:
+        vc = weights.groupby(s, observed=True, dropna=kwargs.get('dropna', True)).sum()
+        vc = vc[vc > 0].sort_values(ascending=kwargs.get('ascending', False), kind='stable')
+        return vc.rename('count').rename_axis(s.name)
+    vc = s.value_counts(**kwargs)
+    return vc[vc > 0] if isinstance(s.dtype, pd.CategoricalDtype) else vc
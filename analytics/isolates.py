@@ -0,0 +1,199 @@
+import numpy as np
+import pandas as pd
+from config import MDR_MIN_CLASSES
+from data.antibiotics import ANTIBIOTICS, CLASS_MASKS, INTRINSIC_RESISTANCE, abx_mask
+from data.pipeline import patient_id_missing
+from profiling import profiled
+
+# First-isolate rule (CLSI M39): per patient and pathogen only the first isolate
+# of the analysed period counts, so repeat cultures of one infection do not
+# inflate %S. With `window_days`, a later isolate counts again once it is at
+# least that many days after the start of the patient's previous counted one.
+
+_DAY_NS = 86_400 * 10**9
+_NAT = np.iinfo(np.int64).min
+
+
+def _codes(s: pd.Series) -> np.ndarray:
+    """Integer codes of a key column (-1 = missing)."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy().astype(np.int64)
+    return pd.factorize(s)[0].astype(np.int64)
+
+
+def _days(s: pd.Series) -> np.ndarray:
+    """Day numbers of a date column (int64; missing = NaT's int64 minimum)."""
+    ns = pd.to_datetime(s, errors='coerce').to_numpy().astype('datetime64[ns]').view(np.int64)
+    return np.where(ns == _NAT, _NAT, ns // _DAY_NS)
+
+
+def _patient_codes(df: pd.DataFrame, patient_col: str) -> np.ndarray:
+    """Patient codes, -1 where the ID is missing ('nan' / 'None' / blank after cleaning too)."""
+    if patient_col == 'patient_id_key' and 'patient_code' in df.columns:
+        codes = df['patient_code'].to_numpy().astype(np.int64)     # dense codes from cleaning
+    else:
+        codes = _codes(df[patient_col])
+    return np.where(patient_id_missing(df[patient_col]), -1, codes)
+
+
+def first_isolate_rows(df: pd.DataFrame, window_days: int = None,
+                       patient_col: str = 'patient_id_key', pathogen_col: str = 'pathogen_clean',
+                       date_col: str = 'sample_date_clean', antibiotic_col: str = 'antibiotic_clean') -> np.ndarray:
+    """
+    Positions (ascending) of the rows that belong to first isolates.
+
+    An isolate is a (patient, pathogen, sample day); for each first isolate one
+    row per antibiotic is kept (the first in row order). Rows without patient,
+    pathogen or sample date cannot be placed and are left out.
+    Vectorized: one sort by (patient, pathogen, day), then episode starts for all
+    patient/pathogen groups at once by searchsorted, one round per episode.
+    """
+    missing = {patient_col, pathogen_col, date_col} - set(df.columns)
+    if missing:
+        raise ValueError(f"First-isolate selection needs the columns: {', '.join(sorted(missing))}")
+
+    pat = _patient_codes(df, patient_col)
+    bug = _codes(df[pathogen_col])
+    day = _days(df[date_col])
+    rows = np.flatnonzero((pat >= 0) & (bug >= 0) & (day != _NAT))
+    if not len(rows):
+        return rows
+
+    day = day[rows] - day[rows].min()
+    group = pat[rows] * (int(bug[rows].max()) + 1) + bug[rows]
+    order = np.lexsort((rows, day, group))
+    rows, day, group = rows[order], day[order], group[order]
+
+    # one sortable key per (group, day); a window search never crosses into the next group
+    span = int(day.max()) + (window_days or 0) + 1
+    key = group * span + day
+    new_group = np.ones(len(key), dtype=bool)
+    new_group[1:] = group[1:] != group[:-1]
+    starts = np.flatnonzero(new_group)
+    if window_days:
+        found, cur = [starts], starts
+        while len(cur):
+            nxt = np.searchsorted(key, key[cur] + window_days, side='left')
+            same = nxt < len(key)
+            same[same] = group[nxt[same]] == group[cur[same]]
+            cur = nxt[same]
+            found.append(cur)
+        starts = np.concatenate(found)
+
+    # rows on an episode's start day, then one per antibiotic
+    run = np.cumsum(np.r_[True, key[1:] != key[:-1]]) - 1
+    is_start = np.zeros(run[-1] + 1, dtype=bool)
+    is_start[run[starts]] = True
+    keep = is_start[run]
+    if antibiotic_col in df.columns:
+        abx = _codes(df[antibiotic_col])[rows]
+        keep[keep] = ~pd.DataFrame({'k': key[keep], 'a': abx[keep]}).duplicated().to_numpy()
+    return np.sort(rows[keep])
+
+
+@profiled()
+def first_isolates(df: pd.DataFrame, window_days: int = None, **cols) -> pd.DataFrame:
+    """The rows of first isolates (see first_isolate_rows), in their original order."""
+    return df.take(first_isolate_rows(df, window_days, **cols))
+
+
+# Isolate-level (wide) view: one row per isolate = (patient, sample day, specimen,
+# pathogen), its S/I/R profile packed into uint64 bitmasks over the canonical
+# antibiotics (bit i = data.antibiotics.ANTIBIOTICS[i]). Per-isolate questions
+# (how many classes is it resistant to?) are then bit operations, not pivots.
+
+ISOLATE_KEYS = ['patient_id_key', 'sample_date_clean', 'specimen_clean', 'pathogen_clean']
+ISOLATE_EXTRA = ['facility_clean', 'hcf_id_clean', 'year_clean']     # carried along from the isolate's first row
+RESISTANCE_CATEGORIES = ['Non-MDR', 'MDR', 'XDR', 'PDR']
+
+
+def _abx_codes(s: pd.Series) -> np.ndarray:
+    """Bit positions of antibiotic_clean values (-1 = not a canonical antibiotic)."""
+    if isinstance(s.dtype, pd.CategoricalDtype) and list(s.cat.categories) == ANTIBIOTICS:
+        return s.cat.codes.to_numpy().astype(np.int64)
+    return pd.Categorical(s.astype(object), categories=ANTIBIOTICS).codes.astype(np.int64)
+
+
+@profiled()
+def isolate_table(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per isolate: the ISOLATE_KEYS (sample date as its day), ISOLATE_EXTRA
+    columns present, n_results, and s_mask / i_mask / r_mask (uint64) with the
+    antibiotics tested S, I and R. Only rows with all keys, a canonical antibiotic
+    and an S/I/R result count. Empty frame without the needed columns.
+    """
+    if not set(ISOLATE_KEYS + ['antibiotic_clean', 'sir_clean']).issubset(df.columns):
+        return pd.DataFrame()
+    keys = [_patient_codes(df, 'patient_id_key'), _days(df['sample_date_clean']),
+            _codes(df['specimen_clean']), _codes(df['pathogen_clean'])]
+    abx = _abx_codes(df['antibiotic_clean'])
+    sir = df['sir_clean']
+    result = {r: (sir == r).to_numpy() for r in ("S", "I", "R")}
+    ok = (keys[0] >= 0) & (keys[1] != _NAT) & (keys[2] >= 0) & (keys[3] >= 0) & (abx >= 0) \
+        & (result["S"] | result["I"] | result["R"])
+    rows = np.flatnonzero(ok)
+    if not len(rows):
+        return pd.DataFrame()
+
+    keys = [k[rows] for k in keys]
+    order = np.lexsort(keys[::-1])           # patient, day, specimen, pathogen
+    rows, keys = rows[order], [k[order] for k in keys]
+    new = np.zeros(len(rows), dtype=bool)
+    new[0] = True
+    for k in keys:
+        new[1:] |= k[1:] != k[:-1]
+    starts = np.flatnonzero(new)
+
+    bits = np.left_shift(np.uint64(1), abx[rows].astype(np.uint64))
+    cols = ISOLATE_KEYS + [c for c in ISOLATE_EXTRA if c in df.columns]
+    out = df[cols].take(rows[starts]).reset_index(drop=True)
+    out['sample_date_clean'] = pd.to_datetime(out['sample_date_clean'], errors='coerce').dt.normalize()
+    out['n_results'] = np.diff(np.r_[starts, len(rows)]).astype('int32')
+    for r in ("S", "I", "R"):
+        out[f"{r.lower()}_mask"] = np.bitwise_or.reduceat(np.where(result[r][rows], bits, np.uint64(0)), starts)
+    return out
+
+
+@profiled()
+def classify_resistance(iso: pd.DataFrame, min_classes: int = MDR_MIN_CLASSES) -> pd.DataFrame:
+    """
+    MDR / XDR / PDR per isolate of isolate_table (Magiorakos et al. 2012), on bitmasks:
+    a class is non-susceptible when any of its agents tested I or R. Intrinsic
+    resistances of the pathogen are left out first; a class applies to the
+    pathogen when any of its agents is not intrinsically resisted.
+      MDR  non-susceptible in >= min_classes classes
+      XDR  MDR, every applicable class tested, and susceptible in at most 2 of them
+      PDR  MDR, every applicable class tested, and non-susceptible to every agent tested
+    XDR and PDR need the full set of applicable classes, so isolates tested on a
+    smaller panel are at most MDR (panel_complete tells them apart).
+    Adds classes_applicable, classes_tested, classes_nonsusceptible, panel_complete,
+    mdr / xdr / pdr (nested) and category (most severe, ordered categorical).
+    """
+    out = iso.copy()
+    if out.empty:
+        return out
+    bugs = out['pathogen_clean'].astype('category')
+    intrinsic = np.array([abx_mask(INTRINSIC_RESISTANCE.get(b, ())) for b in bugs.cat.categories], dtype=np.uint64)
+    keep = ~intrinsic[bugs.cat.codes.to_numpy()]
+    ns = (out['i_mask'].to_numpy() | out['r_mask'].to_numpy()) & keep
+    tested = out['s_mask'].to_numpy() & keep | ns
+
+    n_applicable = np.zeros(len(out), dtype=np.int8)
+    n_tested = np.zeros(len(out), dtype=np.int8)
+    n_ns = np.zeros(len(out), dtype=np.int8)
+    for mask in CLASS_MASKS.values():
+        n_applicable += (keep & mask) != 0
+        n_tested += (tested & mask) != 0
+        n_ns += (ns & mask) != 0
+    complete = n_tested == n_applicable        # tested classes are always applicable ones
+    out['classes_applicable'] = n_applicable
+    out['classes_tested'] = n_tested
+    out['classes_nonsusceptible'] = n_ns
+    out['panel_complete'] = complete
+    out['mdr'] = n_ns >= min_classes
+    out['xdr'] = out['mdr'].to_numpy() & complete & (n_applicable - n_ns <= 2)
+    out['pdr'] = out['mdr'].to_numpy() & complete & (ns == tested)
+    out['category'] = pd.Categorical(
+        np.select([out['pdr'], out['xdr'], out['mdr']], ['PDR', 'XDR', 'MDR'], 'Non-MDR'),
+        categories=RESISTANCE_CATEGORIES, ordered=True)
+    return out
@@ -1,13 +1,26 @@
+import numpy as np
 import pandas as pd
 import io
+from .helpers import value_counts
+from .cube import patients_by
+from .isolates import first_isolates, isolate_table, classify_resistance
+from profiling import profiled
 
+# Grouping on the categorical *_clean columns (data/categories.py) uses their
+# integer codes; observed=True keeps only combinations present in the data.
 
-def organisms_counts(df_f: pd.DataFrame) -> pd.DataFrame:
-    org = (df_f['pathogen_clean'].value_counts(dropna=True)
+
+# `weight`: name of a per-row count column (e.g. 'n' of the AMR cube, see
+# analytics/cube.py); rows then count that many times instead of once.
+
+@profiled()
+def organisms_counts(df_f: pd.DataFrame, weight: str = None) -> pd.DataFrame:
+    org = (value_counts(df_f['pathogen_clean'], weights=df_f[weight] if weight else None, dropna=True)
            .rename_axis('Pathogen').reset_index(name='Count'))
     org['Percent'] = (org['Count'] / org['Count'].sum() * 100).round(2)
     return org
 
+@profiled()
 def ast_table(df_f: pd.DataFrame) -> pd.DataFrame:
     needed = {'antibiotic_clean','sir_clean'}
     if not needed.issubset(df_f.columns):
@@ -18,41 +31,82 @@ def ast_table(df_f: pd.DataFrame) -> pd.DataFrame:
     ] if c in df_f.columns]
     return df_f.dropna(subset=list(needed))[cols].copy()
 
-def antibiogram_matrix(df_f: pd.DataFrame) -> pd.DataFrame:
+@profiled()
+def antibiogram_matrix(df_f: pd.DataFrame, weight: str = None,
+                       first_isolate_only: bool = False, window_days: int = None) -> pd.DataFrame:
     need = {'pathogen_clean','antibiotic_clean','sir_clean'}
     if not need.issubset(df_f.columns):
         return pd.DataFrame()
-    base = (df_f.dropna(subset=['pathogen_clean','antibiotic_clean','sir_clean'])
-                .groupby(['pathogen_clean','antibiotic_clean','sir_clean']).size()
-                .reset_index(name='n'))
-    totals = base.groupby(['pathogen_clean','antibiotic_clean'])['n'].sum().rename('total')
+    if first_isolate_only:           # rows only: the cube has no patient or date left
+        df_f, weight = first_isolates(df_f, window_days), None
+    g = (df_f.dropna(subset=['pathogen_clean','antibiotic_clean','sir_clean'])
+             .groupby(['pathogen_clean','antibiotic_clean','sir_clean'], observed=True))
+    base = (g[weight].sum() if weight else g.size()).reset_index(name='n')
+    base = base[base['n'] > 0]
+    totals = base.groupby(['pathogen_clean','antibiotic_clean'], observed=True)['n'].sum().rename('total')
     base = base.merge(totals, on=['pathogen_clean','antibiotic_clean'])
     base['pct'] = base['n'] / base['total'] * 100
     s = base[base['sir_clean']=='S']
     piv = s.pivot(index='pathogen_clean', columns='antibiotic_clean', values='pct').fillna(0).round(1)
+    piv.index = pd.Index(piv.index.astype(object), name=piv.index.name)
+    piv.columns = pd.Index(piv.columns.astype(object), name=piv.columns.name)
     return piv
 
-def clients_by_SIR(df_f: pd.DataFrame) -> pd.DataFrame:
+@profiled()
+def resistance_counts(df_f: pd.DataFrame, first_isolate_only: bool = False, window_days: int = None,
+                      isolates: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Isolates per pathogen with MDR / XDR / PDR counts and percentages (nested:
+    XDR and PDR isolates are MDR too), see analytics.isolates.classify_resistance.
+    `isolates`: already classified isolates of `df_f`, e.g. kept by the Dashboard.
+    """
+    if isolates is None:
+        rows = first_isolates(df_f, window_days) if first_isolate_only else df_f
+        isolates = classify_resistance(isolate_table(rows))
+    if isolates.empty:
+        return pd.DataFrame()
+    g = (isolates.groupby('pathogen_clean', observed=True)[['mdr', 'xdr', 'pdr']]
+                 .agg(['size', 'sum']))
+    out = pd.DataFrame({'Pathogen': g.index.astype(object), 'Isolates': g[('mdr', 'size')].to_numpy()})
+    for flag in ('mdr', 'xdr', 'pdr'):
+        out[flag.upper()] = g[(flag, 'sum')].to_numpy()
+    for flag in ('MDR', 'XDR', 'PDR'):
+        out[f"%{flag}"] = (out[flag] / out['Isolates'] * 100).round(1)
+    return out.sort_values(['Isolates', 'Pathogen'], ascending=[False, True], ignore_index=True)
+
+# `patients`: the cube's patient sets (analytics.cube.build_patient_sets); when
+# given, `df_f` is the (filtered) cube and unique patients are counted on codes.
+
+@profiled()
+def clients_by_SIR(df_f: pd.DataFrame, patients: pd.DataFrame = None) -> pd.DataFrame:
     id_col = 'patient_id_key' if 'patient_id_key' in df_f.columns else None
     if 'sir_clean' not in df_f.columns: return pd.DataFrame()
-    g = df_f.dropna(subset=['sir_clean']).groupby('sir_clean')
+    if patients is not None:
+        return patients_by(df_f, patients, ['sir_clean']).reset_index(name='UniquePatients')
+    g = df_f.dropna(subset=['sir_clean']).groupby('sir_clean', observed=True)
     if id_col:
         return g[id_col].nunique().reset_index(name='UniquePatients')
     return g.size().reset_index(name='UniquePatients')
 
-def clients_by_patienttype(df_f: pd.DataFrame) -> pd.DataFrame:
+@profiled()
+def clients_by_patienttype(df_f: pd.DataFrame, patients: pd.DataFrame = None) -> pd.DataFrame:
     id_col = 'patient_id_key' if 'patient_id_key' in df_f.columns else None
     if 'patienttype_clean' not in df_f.columns: return pd.DataFrame()
-    g = df_f.dropna(subset=['patienttype_clean']).groupby('patienttype_clean')
+    if patients is not None:
+        return patients_by(df_f, patients, ['patienttype_clean']).reset_index(name='UniquePatients')
+    g = df_f.dropna(subset=['patienttype_clean']).groupby('patienttype_clean', observed=True)
     if id_col:
         return g[id_col].nunique().reset_index(name='UniquePatients')
     return g.size().reset_index(name='UniquePatients')
 
-def clients_by_ptype_and_SIR(df_f: pd.DataFrame) -> pd.DataFrame:
+@profiled()
+def clients_by_ptype_and_SIR(df_f: pd.DataFrame, patients: pd.DataFrame = None) -> pd.DataFrame:
     id_col = 'patient_id_key' if 'patient_id_key' in df_f.columns else None
     need = {'sir_clean','patienttype_clean'}
     if not need.issubset(df_f.columns): return pd.DataFrame()
-    g = df_f.dropna(subset=list(need)).groupby(['patienttype_clean','sir_clean'])
+    if patients is not None:
+        return patients_by(df_f, patients, ['patienttype_clean','sir_clean']).reset_index(name='UniquePatients')
+    g = df_f.dropna(subset=list(need)).groupby(['patienttype_clean','sir_clean'], observed=True)
     if id_col:
         return g[id_col].nunique().reset_index(name='UniquePatients')
     return g.size().reset_index(name='UniquePatients')
@@ -90,14 +144,22 @@ _CATS = [
 
 def _spec_category(series: pd.Series) -> pd.Series:
     """Normalize raw specimen values into fixed indicator categories."""
-    s = series.astype("string").map(clean_specimen)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # clean each category once, then expand by code
+        per_cat = series.cat.categories.astype("string").map(clean_specimen).to_numpy(dtype=object)
+        codes = series.cat.codes.to_numpy()
+        s = pd.Series(np.where(codes >= 0, per_cat[codes], pd.NA), index=series.index, dtype="object")
+    else:
+        s = series.astype("string").map(clean_specimen)
     known = {k for k, _ in _CATS[:-1]}  # all except 'Other'
     return s.where(s.isin(list(known)), "Other")
 
+@profiled()
 def indicator_samples_table(
     df: pd.DataFrame,
     specimen_col: str = "specimen_clean",
     pathogen_col: str = "pathogen_clean",
+    weight: str = None,
 ) -> pd.DataFrame:
     """
     Build indicator rows:
@@ -106,6 +168,7 @@ def indicator_samples_table(
 
     Positivity rule (default): pathogen_clean is present and not blank/'Unknown'/'unk'.
     Adjust by passing a different `pathogen_col` or precomputing a boolean and swapping the rule below.
+    Pass `weight` (e.g. 'n') to build the rows from an aggregated cube instead of row data.
     """
     if specimen_col not in df.columns:
         return pd.DataFrame(columns=["Indicator Code", "Indicator Description", "Number"])
@@ -121,8 +184,10 @@ def indicator_samples_table(
         pos = pd.Series(False, index=tmp.index)
 
     order_keys = [k for k, _ in _CATS]
-    counts_all = tmp["__spec_cat"].value_counts().reindex(order_keys, fill_value=0)
-    counts_pos = tmp.loc[pos, "__spec_cat"].value_counts().reindex(order_keys, fill_value=0)
+    w = tmp[weight] if weight else None
+    counts_all = value_counts(tmp["__spec_cat"], weights=w).reindex(order_keys, fill_value=0)
+    counts_pos = value_counts(tmp.loc[pos, "__spec_cat"], weights=w[pos] if weight else None) \
+        .reindex(order_keys, fill_value=0)
 
     # --- assemble rows ---
     rows = []
@@ -147,6 +212,7 @@ __all__ = ["indicator_samples_table"]
 import pandas as pd
 from typing import Optional, List
 
+@profiled()
 def bug_drug_sir_table(
     df: pd.DataFrame,
     pathogen_col: str = "pathogen_clean",
@@ -162,6 +228,10 @@ def bug_drug_sir_table(
     percent_decimals: int = 1,
     sort_by: Optional[List[str]] = None,
     ascending: Optional[List[bool]] = None,
+    weight: Optional[str] = None,
+    patients: Optional[pd.DataFrame] = None,
+    first_isolate_only: bool = False,
+    window_days: Optional[int] = None,
 ) -> pd.DataFrame:
     """
     Build a tidy table: Bug × Specimen × Antibiotic with S/I/R counts, Total, %S, %I, %R.
@@ -185,14 +255,33 @@ def bug_drug_sir_table(
         Columns to sort by (default: ["Pathogen","Sample Type","Antimicrobial","Total"]).
     ascending : list[bool] | None
         Sort orders matching sort_by (default: [True, True, True, False]).
+    weight : str | None
+        Per-row count column (e.g. 'n' of the AMR cube); row counts become sums of it.
+        Not used when counting unique patients.
+    patients : DataFrame | None
+        Patient sets of the cube (analytics.cube.build_patient_sets); with
+        count_unique_patients, `df` is then the cube and patients are counted on codes.
+    first_isolate_only : bool
+        Count only first isolates per patient and pathogen (CLSI M39, see
+        analytics.isolates); `df` must then be rows, `weight` and `patients` are ignored.
+    window_days : int | None
+        With first_isolate_only: a later isolate counts again after this many days.
 
     Returns
     -------
     DataFrame with columns:
         Pathogen | Sample Type | Antimicrobial | S | I | R | Total | %S | %I | %R
     """
+    if first_isolate_only:
+        df = first_isolates(df, window_days, pathogen_col=pathogen_col, antibiotic_col=antibiotic_col)
+        weight = patients = None
+
     needed = [pathogen_col, specimen_col, antibiotic_col, sir_col]
     extra = [patient_col] if (count_unique_patients and patient_col) else []
+    if count_unique_patients and patients is not None:
+        extra = ['cell']
+    elif weight and weight in df.columns and not extra:
+        extra = [weight]
     data = df[ [c for c in needed + extra if c in df.columns] ].copy()
 
     # Keep only S/I/R
@@ -202,19 +291,28 @@ def bug_drug_sir_table(
     data = data.dropna(subset=[c for c in [pathogen_col, specimen_col, antibiotic_col] if c in data.columns])
 
     # Aggregate
-    if count_unique_patients and patient_col and patient_col in data.columns:
+    if count_unique_patients and patients is not None:
+        grouped = patients_by(data, patients, [pathogen_col, specimen_col, antibiotic_col, sir_col])
+    elif count_unique_patients and patient_col and patient_col in data.columns:
         grouped = (
-            data.groupby([pathogen_col, specimen_col, antibiotic_col, sir_col])[patient_col]
+            data.groupby([pathogen_col, specimen_col, antibiotic_col, sir_col], observed=True)[patient_col]
                 .nunique()
         )
+    elif weight and weight in data.columns:
+        grouped = (
+            data.groupby([pathogen_col, specimen_col, antibiotic_col, sir_col], observed=True)[weight]
+                .sum()
+        )
+        grouped = grouped[grouped > 0]
     else:
         grouped = (
-            data.groupby([pathogen_col, specimen_col, antibiotic_col, sir_col])
+            data.groupby([pathogen_col, specimen_col, antibiotic_col, sir_col], observed=True)
                 .size()
         )
 
     # Pivot S/I/R to columns
     g = grouped.unstack(sir_col, fill_value=0)
+    g.columns = pd.Index(g.columns.astype(object), name=g.columns.name)  # plain labels: Total/%S/... are added below
 
     # Ensure S/I/R columns exist even if empty
     for c in ("S", "I", "R"):
@@ -249,3 +347,72 @@ def bug_drug_sir_table(
 
     out = out.sort_values(sort_by, ascending=ascending, na_position="last").reset_index(drop=True)
     return out
+
+
+# Repeat tests: same patient, samples on more than one calendar day
+REPEAT_OPTIONAL_COLS = ['specimen_clean', 'pathogen_clean', 'sir_clean', 'facility_clean', 'hcf_id_clean']
+
+@profiled()
+def repeat_tests(df_f: pd.DataFrame):
+    """
+    Patients tested on more than one distinct sample date.
+
+    Returns (repeats, details, n_unique):
+      repeats  : one row per such patient with total_rows, distinct_sample_dates,
+                 first_sample_date, last_sample_date (most dates first)
+      details  : all their rows (patient, sample date, REPEAT_OPTIONAL_COLS), by patient and date
+      n_unique : distinct patients in df_f
+    Empty frames and 0 without patient_id_key / sample_date_clean.
+
+    Vectorized: rows are sorted once by (patient, day); a day counts as distinct
+    where it differs from the previous row of the same patient, and per-patient
+    totals come from bincount over the patient codes.
+    """
+    if not {'patient_id_key', 'sample_date_clean'}.issubset(df_f.columns):
+        return pd.DataFrame(), pd.DataFrame(), 0
+    ids = df_f['patient_id_key']
+    has_id = ids.notna().to_numpy()
+    # patient codes in sorted key order (as groupby numbers them)
+    codes, keys = pd.factorize(ids[has_id], sort=True)
+    n_pat = len(keys)
+    dates = pd.to_datetime(df_f['sample_date_clean'][has_id], errors='coerce')
+    days = dates.dt.normalize().to_numpy().astype('datetime64[ns]').view('int64')
+    nat = np.iinfo(np.int64).min                       # NaT sorts first within a patient
+
+    order = np.lexsort((days, codes))
+    c, d = codes[order], days[order]
+    new_pat = np.ones(len(c), dtype=bool)
+    new_pat[1:] = c[1:] != c[:-1]
+    new_day = new_pat.copy()
+    new_day[1:] |= d[1:] != d[:-1]
+    valid = d != nat
+    new_day &= valid
+
+    total = np.bincount(codes, minlength=n_pat)
+    distinct = np.bincount(c, weights=new_day, minlength=n_pat).astype(np.int64)
+    starts = np.flatnonzero(new_pat)
+    if len(c):
+        first = np.minimum.reduceat(np.where(valid, d, np.iinfo(np.int64).max), starts)
+        last = d[np.r_[starts[1:], len(c)] - 1]      # NaT sorts first: last row has the latest day
+    else:
+        first = last = d
+
+    rep = np.flatnonzero(distinct > 1)
+    to_date = lambda v: pd.Series(pd.to_datetime(np.where(v == np.iinfo(np.int64).max, nat, v))).dt.date.to_numpy()
+    repeats = pd.DataFrame({
+        'patient_id_key': keys[rep],
+        'total_rows': total[rep],
+        'distinct_sample_dates': distinct[rep],
+        'first_sample_date': to_date(first[rep]),
+        'last_sample_date': to_date(last[rep]),
+    }, index=rep).sort_values(['distinct_sample_dates', 'last_sample_date'], ascending=[False, False], kind='stable')
+
+    # Detailed rows for flagged patients, by patient then sample date (missing dates last)
+    is_rep = (distinct > 1)[codes]
+    t = dates.to_numpy().astype('datetime64[ns]').view('int64')
+    t = np.where(t == nat, np.iinfo(np.int64).max, t)
+    sel = np.flatnonzero(is_rep)
+    sel = sel[np.lexsort((t[sel], codes[sel]))]
+    details = df_f[has_id].iloc[sel].reindex(columns=['patient_id_key', 'sample_date_clean', *REPEAT_OPTIONAL_COLS])
+    details['sample_date_clean'] = dates.iloc[sel].dt.date.to_numpy()
+    return repeats, details, n_pat
@@ -0,0 +1,260 @@
+"""
+Headless batch run: clean a directory of facility files (CSV/Excel) and write
+every Dashboard table per facility and overall, without Streamlit.
+
+    python batch.py INPUT_DIR OUTPUT_DIR [--workers 8] [--format .csv] [--force]
+
+Outputs:
+    OUTPUT_DIR/overall/<table>.<ext>                 all files together
+    OUTPUT_DIR/facilities/<facility>/<table>.<ext>   one directory per facility_clean
+    OUTPUT_DIR/files.csv                             per input file: rows, facilities, status
+    (--format .xlsx writes one tables.xlsx per directory instead, one sheet per table)
+
+Each file is row-cleaned in a worker process once per content hash (and cleaner
+version); the row-cleaned part is kept in OUTPUT_DIR/.batch and reused while the
+file is unchanged. Patient completion then runs over all files together, exactly
+as clean_data does for the concatenated data. Only facilities touched by changed
+files (their rows, or rows of patients in them) get their tables rewritten; a run
+with no changed file exits without writing anything.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from analytics.cube import build_cube, build_patient_sets, filter_cube
+from analytics.tables import (
+    organisms_counts, ast_table, antibiogram_matrix,
+    clients_by_SIR, clients_by_patienttype, clients_by_ptype_and_SIR,
+    indicator_samples_table, bug_drug_sir_table, repeat_tests, resistance_counts
+)
+from config import FIRST_ISOLATE_WINDOW_DAYS
+from data.cache import cache_key
+from data.export import EXPORT_FORMATS, write_export
+from data.pipeline import CLEAN_COLUMNS, clean_rows, complete_patient_fields, compact_frame
+from data.store import arrow_safe, read_raw
+from profiling import start_run, stage, append_log
+
+INPUT_EXTENSIONS = (".csv", ".xlsx", ".xls")
+STATE_DIR = ".batch"            # manifest + row-cleaned parts, inside OUTPUT_DIR
+MANIFEST = "manifest.json"
+
+
+def input_files(input_dir: str) -> list:
+    return sorted(f for f in os.listdir(input_dir)
+                  if f.lower().endswith(INPUT_EXTENSIONS) and os.path.isfile(os.path.join(input_dir, f)))
+
+
+def file_key(path: str) -> str:
+    """Content address of an input file (bytes + reader kind + cleaner version), as in the Dashboard cache."""
+    kind = "excel" if path.lower().endswith((".xlsx", ".xls")) else "csv"
+    with open(path, "rb") as fh:
+        return cache_key(fh.read(), kind)
+
+
+def load_manifest(state_dir: str) -> dict:
+    path = os.path.join(state_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_manifest(manifest: dict, state_dir: str) -> None:
+    tmp = os.path.join(state_dir, MANIFEST + ".tmp")
+    with open(tmp, "w") as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(state_dir, MANIFEST))
+
+
+def clean_file(path: str, part_path: str) -> dict:
+    """Worker: read + row-clean one file into a Parquet part (cleaned columns only)."""
+    try:
+        df = clean_rows(read_raw(path))
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    df = df[[c for c in CLEAN_COLUMNS if c in df.columns]]
+    arrow_safe(df).to_parquet(part_path, index=False)
+    facilities = df['facility_clean'].dropna().astype(str).unique().tolist() if 'facility_clean' in df.columns else []
+    return {"rows": len(df), "facilities": sorted(facilities)}
+
+
+def clean_files(jobs: list, workers: int) -> list:
+    """clean_file over (path, part_path) jobs, in worker processes when there is more than one."""
+    if workers <= 1 or len(jobs) <= 1:
+        return [clean_file(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return list(pool.map(clean_file, *zip(*jobs)))
+
+
+def scope_tables(df: pd.DataFrame, cube: pd.DataFrame, patients: pd.DataFrame) -> dict:
+    """
+    Every Dashboard table for one scope, by output name: count tables from the
+    (filtered) cube, row-level ones from `df`. Tables the data has no columns for are left out.
+    """
+    cols = set(df.columns)
+    out = {}
+    if 'pathogen_clean' in cols:
+        out["organisms"] = organisms_counts(cube, weight='n')
+    out["interpreted_ast"] = ast_table(df)
+    out["antibiogram_matrix"] = antibiogram_matrix(cube, weight='n').reset_index()
+    if {'patient_id_key', 'sample_date_clean'} <= cols:
+        out["antibiogram_first_isolates"] = antibiogram_matrix(
+            df, first_isolate_only=True, window_days=FIRST_ISOLATE_WINDOW_DAYS or None).reset_index()
+    if patients is not None:
+        out["clients_by_SIR"] = clients_by_SIR(cube, patients)
+        out["clients_by_PatientType"] = clients_by_patienttype(cube, patients)
+        out["clients_by_PType_SIR"] = clients_by_ptype_and_SIR(cube, patients)
+    else:
+        out["clients_by_SIR"] = clients_by_SIR(df)
+        out["clients_by_PatientType"] = clients_by_patienttype(df)
+        out["clients_by_PType_SIR"] = clients_by_ptype_and_SIR(df)
+    out["lab_indicators"] = indicator_samples_table(cube, weight='n')
+    if {'pathogen_clean', 'specimen_clean', 'antibiotic_clean', 'sir_clean'} <= cols:
+        out["bug_drug_SIR_table"] = bug_drug_sir_table(cube, weight='n')
+    out["mdr_xdr_pdr_by_pathogen"] = resistance_counts(df)
+    repeats, details, _ = repeat_tests(df)
+    out["repeat_tests_summary"] = repeats
+    out["repeat_tests_details"] = details
+    return {name: t for name, t in out.items() if not t.empty}
+
+
+def write_scope(tables: dict, out_dir: str, ext: str) -> None:
+    """Replace out_dir with the tables: one file each, or one workbook for .xlsx."""
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+    if ext == ".xlsx":
+        write_export(tables, os.path.join(out_dir, "tables.xlsx"), "xlsx")
+        return
+    kind = EXPORT_FORMATS[ext][1]
+    for name, t in tables.items():
+        write_export(t, os.path.join(out_dir, f"{name}{ext}"), kind)
+
+
+def facility_dir_name(facility: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", str(facility)).strip("._") or "facility"
+
+
+def run(input_dir: str, output_dir: str, workers: int = None, ext: str = ".csv", force: bool = False) -> dict:
+    """One batch run; returns a summary (files cleaned/unchanged/failed, facilities written)."""
+    workers = workers or os.cpu_count() or 1
+    state_dir = os.path.join(output_dir, STATE_DIR)
+    parts_dir = os.path.join(state_dir, "parts")
+    os.makedirs(parts_dir, exist_ok=True)
+    old = {} if force else load_manifest(state_dir)
+
+    names = input_files(input_dir)
+    with stage("hash files"):
+        keys = {name: file_key(os.path.join(input_dir, name)) for name in names}
+    part = lambda key: os.path.join(parts_dir, f"{key}.parquet")
+    unchanged = [n for n in names if n in old and old[n]["key"] == keys[n] and os.path.exists(part(keys[n]))]
+    changed = [n for n in names if n not in unchanged]
+    removed = [n for n in old if n not in keys]
+    summary = {"files": len(names), "cleaned": changed, "unchanged": unchanged, "removed": removed,
+               "failed": {}, "facilities": []}
+    if not changed and not removed and os.path.isdir(os.path.join(output_dir, "overall")):
+        return summary
+
+    with stage("clean files"):
+        results = clean_files([(os.path.join(input_dir, n), part(keys[n])) for n in changed], workers)
+    manifest = {n: old[n] for n in unchanged}
+    for n, res in zip(changed, results):
+        if "error" in res:
+            summary["failed"][n] = res["error"]
+            if n in old and os.path.exists(part(old[n]["key"])):
+                manifest[n] = old[n]      # keep the last good version of the file
+        else:
+            manifest[n] = {"key": keys[n], **res}
+    summary["cleaned"] = [n for n in changed if n not in summary["failed"]]
+
+    with stage("load + complete patients"):
+        order = sorted(manifest)
+        frames = [pd.read_parquet(part(manifest[n]["key"])) for n in order]
+        if not frames:
+            return summary
+        df = compact_frame(complete_patient_fields(pd.concat(frames, ignore_index=True)), keep_raw=False)
+        fresh = np.repeat([n in summary["cleaned"] for n in order], [len(f) for f in frames])
+    with stage("build cube"):
+        cube, patients = build_cube(df), build_patient_sets(df)
+
+    facilities = df['facility_clean'].dropna().astype(str).unique().tolist() if 'facility_clean' in df.columns else []
+    fac_root = os.path.join(output_dir, "facilities")
+    if force:
+        affected = set(facilities)
+    else:
+        # facilities of changed/removed files, plus those of patients seen in changed files
+        # (their rows are completed from the other files' values and vice versa)
+        affected = {f for n in summary["cleaned"] + removed for f in old.get(n, {}).get("facilities", [])}
+        affected |= {f for n in summary["cleaned"] for f in manifest[n]["facilities"]}
+        if 'patient_id_key' in df.columns and 'facility_clean' in df.columns:
+            ids = [df.loc[fresh, 'patient_id_key']]
+            for n in removed:
+                path = part(old[n]["key"])
+                if os.path.exists(path):
+                    ids.append(pd.read_parquet(path).get('patient_id_key', pd.Series(dtype=object)))
+            touched = df['patient_id_key'].isin(pd.concat(ids).astype(str).unique()).to_numpy() | fresh
+            affected |= set(df.loc[touched, 'facility_clean'].dropna().astype(str).unique())
+        affected |= {f for f in facilities if not os.path.isdir(os.path.join(fac_root, facility_dir_name(f)))}
+
+    with stage("overall tables", rows=len(df)):
+        write_scope(scope_tables(df, cube, patients), os.path.join(output_dir, "overall"), ext)
+    if facilities:
+        rows_by_facility = df.groupby(df['facility_clean'].astype(str), observed=True).indices
+        for f in sorted(affected & set(facilities)):
+            with stage(f"facility {f}"):
+                fac_df = df.take(rows_by_facility[f])
+                fac_cube = filter_cube(cube, {'facility_clean': [f]})
+                write_scope(scope_tables(fac_df, fac_cube, patients), os.path.join(fac_root, facility_dir_name(f)), ext)
+        summary["facilities"] = sorted(affected & set(facilities))
+    for f in affected - set(facilities):          # no rows left for this facility
+        shutil.rmtree(os.path.join(fac_root, facility_dir_name(f)), ignore_errors=True)
+
+    pd.DataFrame([{"file": n, "rows": manifest[n]["rows"], "facilities": "; ".join(manifest[n]["facilities"]),
+                   "status": f"failed (previous version used): {summary['failed'][n]}" if n in summary["failed"]
+                   else "cleaned" if n in summary["cleaned"] else "unchanged"} for n in order]
+                 + [{"file": n, "rows": 0, "facilities": "", "status": f"failed: {e}"}
+                    for n, e in summary["failed"].items() if n not in manifest]) \
+        .to_csv(os.path.join(output_dir, "files.csv"), index=False)
+
+    save_manifest(manifest, state_dir)
+    keep = {f"{m['key']}.parquet" for m in manifest.values()}
+    for f in os.listdir(parts_dir):
+        if f not in keep:
+            os.remove(os.path.join(parts_dir, f))
+    return summary
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('input_dir')
+    ap.add_argument('output_dir')
+    ap.add_argument('--workers', type=int, default=None, help="cleaning processes (default: all CPUs)")
+    ap.add_argument('--format', default=".csv", choices=list(EXPORT_FORMATS), help="table file format")
+    ap.add_argument('--force', action='store_true', help="re-clean every file and rewrite every table")
+    ap.add_argument('--profile', action='store_true', help="append stage timings to OUTPUT_DIR/profile.jsonl")
+    args = ap.parse_args(argv)
+
+    start_run(args.profile or None)
+    t0 = time.perf_counter()
+    summary = run(args.input_dir, args.output_dir, args.workers, args.format, args.force)
+    print(f"{summary['files']} files: {len(summary['cleaned'])} cleaned, {len(summary['unchanged'])} unchanged, "
+          f"{len(summary['removed'])} removed, {len(summary['failed'])} failed")
+    if summary["cleaned"] or summary["removed"]:
+        print(f"tables written: overall + {len(summary['facilities'])} facilities ({time.perf_counter() - t0:.1f}s)")
+    elif not summary["failed"]:
+        print("nothing changed since the last run")
+    for n, e in summary["failed"].items():
+        print(f"  FAILED {n}: {e}", file=sys.stderr)
+    if args.profile:
+        append_log(os.path.join(args.output_dir, "profile.jsonl"), job="batch", files=summary["files"],
+                   cleaned=len(summary["cleaned"]))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+Benchmark: serial clean_data vs clean_data_parallel at several worker counts.
+
+    python -m benchmarks.bench_parallel_clean --rows 5000000 --workers 1 2 4 8 16
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from data.demo import get_demo_df
+from data.pipeline import clean_data
+from data.parallel import clean_data_parallel
+
+
+def make_raw(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Demo rows resampled to `rows`, with ~4 rows per patient."""
+    rng = np.random.default_rng(seed)
+    demo = get_demo_df()
+    df = demo.iloc[rng.integers(0, len(demo), rows)].reset_index(drop=True)
+    df['PATIENT_ID'] = pd.Series(rng.integers(0, max(1, rows // 4), rows)).map('P{:08d}'.format)
+    return df
+
+
+def _strip(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df.attrs = {}
+    return df
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--rows', type=int, default=1_000_000)
+    ap.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = ap.parse_args(argv)
+
+    raw = make_raw(args.rows)
+    t0 = time.perf_counter()
+    serial = clean_data(raw)
+    t_serial = time.perf_counter() - t0
+    print(f"rows={args.rows:,}")
+    print(f"serial     : {t_serial:8.2f} s")
+
+    for w in args.workers:
+        t0 = time.perf_counter()
+        out = clean_data_parallel(raw, workers=w, min_rows_per_worker=1)
+        t = time.perf_counter() - t0
+        pd.testing.assert_frame_equal(_strip(out), _strip(serial))
+        print(f"workers={w:<3}: {t:8.2f} s  speedup {t_serial / t:5.2f}x  (identical to serial)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""
+Benchmark suite: cleaning, patient completion, filter resolution and every
+analytics table on synthetic data (data/synthetic.py) at several sizes.
+
+Reports seconds (best of --repeat), rows/sec and peak traced memory per stage,
+and compares them with benchmarks/baselines.json.
+
+    python -m benchmarks.bench_pipeline --rows 10000 100000 1000000
+    python -m benchmarks.bench_pipeline --rows 100000 --save     # record baselines
+    python -m benchmarks.bench_pipeline --check                  # exit 1 on a regression
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import analytics.tables as tables
+from analytics.cube import build_cube, build_patient_sets, filter_cube
+from analytics.isolates import first_isolates
+from data.bitmaps import FilterIndex
+from data.pipeline import clean_data, clean_rows, complete_patient_fields
+from data.synthetic import get_synthetic_df
+
+from streamlit.logger import set_log_level
+set_log_level("error")   # no bare-mode cache warnings from ui.controls
+from ui.controls import FILTERS  # noqa: E402
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+FILTER_COLUMNS = [col for _, col, _ in FILTERS]
+
+
+def table_functions():
+    """Every public function defined in analytics/tables.py."""
+    return [f for name, f in inspect.getmembers(tables, inspect.isfunction)
+            if f.__module__ == tables.__name__ and not name.startswith('_')]
+
+
+def _selection(index: FilterIndex) -> dict:
+    """A typical dashboard selection: latest year, half the facilities, one gender unticked."""
+    sel = {}
+    if 'year_clean' in index.values:
+        sel['year_clean'] = index.values['year_clean'][-1:]
+    if 'facility_clean' in index.values:
+        sel['facility_clean'] = index.values['facility_clean'][::2]
+    if 'gender_clean' in index.values:
+        sel['gender_clean'] = index.values['gender_clean'][:-1]
+    return sel
+
+
+def filters_panel_logic(df: pd.DataFrame, index: FilterIndex, selections: dict) -> pd.DataFrame:
+    """What ui.controls.filters_panel does per rerun, without widgets (index memo cleared first)."""
+    index._masks.clear()
+    index._options.clear()
+    applied = {}
+    for col in FILTER_COLUMNS:
+        if col in index.columns:
+            index.options(col, applied)
+            if col in selections:
+                applied[col] = selections[col]
+    rows = index.rows(applied)
+    return df if rows is None else df.take(rows)
+
+
+def stages(raw: pd.DataFrame):
+    """(name, callable) per benchmarked stage; inputs are prepared outside the timings."""
+    rows = clean_rows(raw)
+    df = clean_data(raw)
+    index = FilterIndex(df, FILTER_COLUMNS)
+    selections = _selection(index)
+    cube, patients = build_cube(df), build_patient_sets(df)
+    cube_f = filter_cube(cube, selections)
+
+    out = [
+        ("clean_data", lambda: clean_data(raw)),
+        ("clean_rows", lambda: clean_rows(raw)),
+        ("complete_patient_fields", lambda: complete_patient_fields(rows)),
+        ("filter_index", lambda: FilterIndex(df, FILTER_COLUMNS)),
+        ("filters_panel", lambda: filters_panel_logic(df, index, selections)),
+        ("build_cube", lambda: build_cube(df)),
+        ("build_patient_sets", lambda: build_patient_sets(df)),
+        ("first_isolates", lambda: first_isolates(df)),
+        ("first_isolates[30d]", lambda: first_isolates(df, window_days=30)),
+    ]
+    for f in table_functions():
+        params = inspect.signature(f).parameters
+        kwargs = {"patient_col": "patient_id_key"} if "patient_col" in params else {}
+        out.append((f.__name__, lambda f=f, kw=kwargs: f(df, **kw)))
+        if "first_isolate_only" in params:
+            out.append((f"{f.__name__}[first_isolates]",
+                        lambda f=f, kw=kwargs: f(df, first_isolate_only=True, **kw)))
+        # the dashboard's path: the same table from the (filtered) cube
+        cube_kwargs = {}
+        if "weight" in params:
+            cube_kwargs["weight"] = "n"
+        if "patients" in params:
+            cube_kwargs["patients"] = patients
+        if "count_unique_patients" in params:
+            cube_kwargs["count_unique_patients"] = True
+        if cube_kwargs:
+            out.append((f"{f.__name__}[cube]", lambda f=f, kw={**kwargs, **cube_kwargs}: f(cube_f, **kw)))
+    return out
+
+
+def measure(fn, repeat: int, memory: bool) -> dict:
+    best = float("inf")
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+        if best > 5:      # slow stage: one run is enough
+            break
+    peak = None
+    if memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        peak = (tracemalloc.get_traced_memory()[1] - base) / 1024**2
+        tracemalloc.stop()
+    return {"seconds": best, "peak_mb": peak}
+
+
+def run(sizes, repeat: int = 3, memory: bool = True, seed: int = 0) -> dict:
+    results = {}
+    for n in sizes:
+        raw = get_synthetic_df(n, seed=seed)
+        results[str(n)] = res = {}
+        for name, fn in stages(raw):
+            res[name] = m = measure(fn, repeat, memory)
+            m["rows_per_sec"] = n / m["seconds"] if m["seconds"] > 0 else None
+    return results
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+        "machine": platform.machine(), "cpus": os.cpu_count(),
+    }
+
+
+def load_baselines(path: str = BASELINES) -> dict:
+    if not os.path.exists(path):
+        return {"environment": {}, "results": {}}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_baselines(results: dict, path: str = BASELINES) -> None:
+    """Merge `results` into the baselines file (sizes not re-run keep their old numbers)."""
+    data = load_baselines(path)
+    data["environment"] = environment()
+    for n, stages_ in results.items():
+        data["results"].setdefault(n, {}).update(
+            {k: {"seconds": round(v["seconds"], 5),
+                 "peak_mb": None if v["peak_mb"] is None else round(v["peak_mb"], 2)}
+             for k, v in stages_.items()})
+    with open(path, "w") as fh:
+        json.dump(data, fh, indent=1, sort_keys=True)
+        fh.write("\n")
+
+
+def regressions(results: dict, baselines: dict, tolerance: float, min_seconds: float = 0.01) -> list:
+    """(size, stage, metric, baseline, now) where `now` exceeds baseline by more than `tolerance`."""
+    out = []
+    for n, stages_ in results.items():
+        for name, m in stages_.items():
+            b = baselines.get("results", {}).get(n, {}).get(name)
+            if not b:
+                continue
+            # very fast stages are too noisy to compare on time
+            if b["seconds"] >= min_seconds and m["seconds"] > b["seconds"] * (1 + tolerance):
+                out.append((n, name, "seconds", b["seconds"], m["seconds"]))
+            if b.get("peak_mb") and m["peak_mb"] is not None and m["peak_mb"] > b["peak_mb"] * (1 + tolerance) \
+                    and m["peak_mb"] - b["peak_mb"] > 1:
+                out.append((n, name, "peak_mb", b["peak_mb"], m["peak_mb"]))
+    return out
+
+
+def report(results: dict, baselines: dict) -> None:
+    for n, stages_ in results.items():
+        print(f"\nrows={int(n):,}")
+        print(f"{'stage':<36}{'seconds':>10}{'rows/s':>14}{'peak MB':>10}{'vs base':>10}")
+        for name, m in stages_.items():
+            b = baselines.get("results", {}).get(n, {}).get(name)
+            delta = f"{(m['seconds'] / b['seconds'] - 1) * 100:+.0f}%" if b and b["seconds"] else ""
+            peak = "" if m["peak_mb"] is None else f"{m['peak_mb']:.1f}"
+            print(f"{name:<36}{m['seconds']:>10.4f}{m['rows_per_sec']:>14,.0f}{peak:>10}{delta:>10}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--no-memory', action='store_true', help="skip the traced-memory run")
+    ap.add_argument('--save', action='store_true', help="store these results as the baselines")
+    ap.add_argument('--check', action='store_true', help="exit 1 if a stage regressed beyond --tolerance")
+    ap.add_argument('--tolerance', type=float, default=0.25)
+    ap.add_argument('--baselines', default=BASELINES)
+    ap.add_argument('--json', help="also write the results to this file")
+    args = ap.parse_args(argv)
+
+    results = run(args.rows, args.repeat, not args.no_memory, args.seed)
+    baselines = load_baselines(args.baselines)
+    report(results, baselines)
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"environment": environment(), "results": results}, fh, indent=1)
+    if args.save:
+        save_baselines(results, args.baselines)
+        print(f"\nbaselines saved to {args.baselines}")
+
+    found = regressions(results, baselines, args.tolerance)
+    if found:
+        print(f"\nregressions (> {args.tolerance:.0%} over baseline):")
+        for n, name, metric, b, now in found:
+            print(f"  rows={int(n):,} {name} {metric}: {b:.4g} -> {now:.4g}")
+    if args.check and found:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,49 @@
+import os
+import tempfile
+
 APP_TITLE = "🧪 Lab Data Cleaner & Dashboard"
+
+# Working files (stores, caches) live here; override with LAB_ANALYTICS_HOME
+DATA_HOME = os.environ.get("LAB_ANALYTICS_HOME", os.path.join(tempfile.gettempdir(), "lab_analytics"))
+
+# CSV uploads larger than this are streamed in chunks into an on-disk Parquet store
+STREAM_THRESHOLD_MB = 200
+STREAM_CHUNK_ROWS = 250_000
+STORE_DIR = os.path.join(DATA_HOME, "stores")
+STORE_MAX_MB = 8192          # streamed stores kept on disk (LRU by size)
+
+# Cleaned datasets cached on disk by file content + cleaner version (LRU by size)
+CACHE_DIR = os.path.join(DATA_HOME, "cache")
+CACHE_MAX_MB = 2048
+
+# Worker processes for cleaning (1 = serial); frames below CLEAN_MIN_ROWS_PER_WORKER
+# rows per worker are cleaned serially anyway
+CLEAN_WORKERS = int(os.environ.get("LAB_ANALYTICS_WORKERS", "1"))
+CLEAN_MIN_ROWS_PER_WORKER = 50_000
+
+# Cleaned datasets held in memory once per process and shared by all sessions (LRU by size)
+REGISTRY_MAX_MB = 8192
+
+# Keep the raw source columns next to the *_clean ones (False = cleaned + key columns only)
+KEEP_RAW_COLUMNS = True
+
+# Per-session memo of tab results (tables, figures) kept for switching back to a tab (LRU by size)
+TAB_MEMO_MAX_MB = 128
+
+# Cumulative store that monthly submissions are appended to (only the new file is cleaned)
+CUMULATIVE_STORE = os.path.join(DATA_HOME, "cumulative")
+
+# On-demand downloads are written once per dataset/filter signature and reused (LRU by size)
+EXPORT_DIR = os.path.join(DATA_HOME, "exports")
+EXPORT_MAX_MB = 4096
+
+# Per-stage profiling (Performance panel on the Dashboard); runs are appended to PROFILE_LOG
+PROFILE = os.environ.get("LAB_ANALYTICS_PROFILE", "0") == "1"
+PROFILE_LOG = os.path.join(DATA_HOME, "profile.jsonl")
+
+# Antibiograms on first isolates (CLSI M39): default window in days after which a
+# patient's isolate of the same pathogen counts again (0 = first per analysed period)
+FIRST_ISOLATE_WINDOW_DAYS = 0
+
+# MDR: non-susceptible to at least one agent in this many antimicrobial classes
+MDR_MIN_CLASSES = 3
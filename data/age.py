@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+# Age in years from (age_value, age_type), one conversion table for the whole app
+AGE_UNIT_YEARS = {
+    "Years": 1.0,
+    "Months": 1.0 / 12.0,
+    "Weeks": 7.0 / 365.25,
+    "Days": 1.0 / 365.25,
+    "Hours": 1.0 / (24.0 * 365.25),
+}
+MAX_AGE_YEARS = 120       # ages outside [0, MAX_AGE_YEARS] are treated as missing
+
+# Coarse bands (Dashboard demographics): [0, 1], (1, 5], ..., (65, 120]; missing -> 'Unknown'
+AGE_BAND_BINS = [-0.01, 1, 5, 15, 25, 45, 65, 120]
+AGE_BAND_LABELS = ["<1y", "1–5y", "5–15y", "15–25y", "25–45y", "45–65y", "65+y"]
+
+# 5-year bands: [0, 1), [1, 5), [5, 10), ..., [80, 85), [85, inf); missing stays missing
+AGE_BAND_5Y_BINS = [-np.inf, 1, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65, 70, 75, 80, 85, np.inf]
+AGE_BAND_5Y_LABELS = ["0–1 Years", "1–4 Years"] + \
+    [f"{lo}–{lo + 4} Years" for lo in range(5, 85, 5)] + ["85+ Years"]
+
+AGE_COLUMNS = ['age_years', 'age_band', 'age_band_5y']
+
+
+def age_in_years(value: pd.Series, unit: pd.Series, max_years: float = MAX_AGE_YEARS) -> pd.Series:
+    """Vectorized age in years (float64); unknown units and out-of-range ages are NaN."""
+    factor = pd.Series(unit, copy=False).astype(object).map(AGE_UNIT_YEARS).astype(float)
+    years = pd.to_numeric(value, errors="coerce").astype(float) * factor.to_numpy()
+    return years.where((years >= 0) & (years <= float(max_years)))
+
+
+def age_bands(years: pd.Series) -> pd.Series:
+    """Coarse age bands as a categorical, with 'Unknown' for missing or out-of-range ages."""
+    band = pd.cut(pd.to_numeric(years, errors="coerce"), bins=AGE_BAND_BINS,
+                  labels=AGE_BAND_LABELS, include_lowest=True)
+    return band.cat.add_categories(["Unknown"]).fillna("Unknown")
+
+
+def age_bands_5y(years: pd.Series) -> pd.Series:
+    """5-year age bands as a categorical ([lower, upper) intervals, 85+ open-ended)."""
+    return pd.cut(pd.to_numeric(years, errors="coerce"), bins=AGE_BAND_5Y_BINS,
+                  labels=AGE_BAND_5Y_LABELS, right=False)
+
+
+def add_age_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    age_years (float32) and both band columns from age_value + age_type, in place.
+    Run after patient completion, so completed ages are banded too.
+    """
+    if not {'age_value', 'age_type'}.issubset(df.columns):
+        return df
+    years = age_in_years(df['age_value'], df['age_type'])
+    df['age_years'] = years.astype('float32')
+    df['age_band'] = age_bands(years)          # banded from float64: no float32 edge drift
+    df['age_band_5y'] = age_bands_5y(years)
+    return df
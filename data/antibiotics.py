@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+from .categories import VOCABULARIES
+
+# Canonical antibiotics (the antibiotic_clean vocabulary, i.e. the ABX_MAP
+# targets) and one bit per antibiotic, in vocabulary order: bit i is the
+# antibiotic with category code i, so a set of antibiotics packs into one uint64.
+ANTIBIOTICS = VOCABULARIES['antibiotic_clean']
+assert len(ANTIBIOTICS) <= 64, "antibiotic bitmasks are uint64"
+ABX_BIT = {name: np.uint64(1) << np.uint64(i) for i, name in enumerate(ANTIBIOTICS)}
+
+# Antimicrobial categories for MDR/XDR/PDR (Magiorakos et al. 2012, adapted to the
+# antibiotics the cleaners recognise); every canonical antibiotic is in exactly one
+ABX_CLASSES = {
+    'Aminoglycosides':                  ['Amikacin', 'Gentamicin', 'Streptomycin'],
+    'Penicillins':                      ['Amoxicillin', 'Ampicillin', 'Penicillin', 'Penicillin G'],
+    'Anti-staphylococcal penicillins':  ['Cloxacillin', 'Oxacillin'],
+    'Penicillins + β-lactamase inhibitors': ['Amoxicillin-clavulanate'],
+    'Non-extended-spectrum cephalosporins': ['Cefuroxime'],
+    'Extended-spectrum cephalosporins': ['Cefepime', 'Cefixime', 'Cefotaxime', 'Cefpirome', 'Ceftazidime', 'Ceftriaxone'],
+    'Cephamycins':                      ['Cefoxitin'],
+    'Carbapenems':                      ['Ertapenem', 'Imipenem', 'Meropenem'],
+    'Quinolones':                       ['Ciprofloxacin', 'Nalidixic acid', 'Norfloxacin'],
+    'Macrolides':                       ['Azithromycin', 'Erythromycin'],
+    'Lincosamides':                     ['Clindamycin'],
+    'Folate pathway inhibitors':        ['Co-trimoxazole'],
+    'Phenicols':                        ['Chloramphenicol'],
+    'Polymyxins':                       ['Colistin'],
+    'Glycopeptides':                    ['Vancomycin'],
+    'Oxazolidinones':                   ['Linezolid'],
+    'Tetracyclines':                    ['Tetracycline'],
+    'Glycylcyclines':                   ['Tigecycline'],
+    'Nitrofurans':                      ['Nitrofurantoin'],
+}
+
+# Intrinsic resistance (EUCAST expert rules, abridged to these pathogens and
+# antibiotics): such results say nothing about acquired resistance and are left
+# out of the MDR/XDR/PDR classification.
+_GRAM_NEGATIVE = ['Clindamycin', 'Cloxacillin', 'Erythromycin', 'Linezolid', 'Oxacillin',
+                  'Penicillin', 'Penicillin G', 'Vancomycin']
+_AMINOPENICILLINS = ['Amoxicillin', 'Ampicillin']
+_PSEUDOMONAS = _GRAM_NEGATIVE + _AMINOPENICILLINS + [
+    'Amoxicillin-clavulanate', 'Cefixime', 'Cefotaxime', 'Cefoxitin', 'Ceftriaxone', 'Cefuroxime',
+    'Chloramphenicol', 'Co-trimoxazole', 'Ertapenem', 'Nalidixic acid', 'Tetracycline', 'Tigecycline']
+INTRINSIC_RESISTANCE = {
+    'Escherichia coli':                     _GRAM_NEGATIVE,
+    'Salmonella Group D':                   _GRAM_NEGATIVE,
+    'Salmonella Typhi':                     _GRAM_NEGATIVE,
+    'Lactose fermenters (unspecified)':     _GRAM_NEGATIVE,
+    'Non-lactose fermenters (unspecified)': _GRAM_NEGATIVE,
+    'Klebsiella pneumoniae':                _GRAM_NEGATIVE + _AMINOPENICILLINS,
+    'Klebsiella oxytoca':                   _GRAM_NEGATIVE + _AMINOPENICILLINS,
+    'Enterobacter cloacae':                 _GRAM_NEGATIVE + _AMINOPENICILLINS + ['Amoxicillin-clavulanate', 'Cefoxitin'],
+    'Enterobacter spp':                     _GRAM_NEGATIVE + _AMINOPENICILLINS + ['Amoxicillin-clavulanate', 'Cefoxitin'],
+    'Pseudomonas aeruginosa':               _PSEUDOMONAS,
+    'Stenotrophomonas maltophilia':         _GRAM_NEGATIVE + _AMINOPENICILLINS + [
+        'Amikacin', 'Amoxicillin-clavulanate', 'Cefixime', 'Cefotaxime', 'Cefoxitin', 'Ceftriaxone',
+        'Cefuroxime', 'Ertapenem', 'Gentamicin', 'Imipenem', 'Meropenem', 'Streptomycin'],
+    'Staphylococcus aureus':                ['Colistin', 'Nalidixic acid'],
+    'Staphylococcus epidermidis':           ['Colistin', 'Nalidixic acid'],
+    'Staphylococcus saprophyticus':         ['Colistin', 'Nalidixic acid'],
+    'Streptococcus pneumoniae':             ['Amikacin', 'Colistin', 'Gentamicin', 'Nalidixic acid', 'Streptomycin'],
+}
+
+
+def abx_mask(names) -> np.uint64:
+    """Bitmask of the given canonical antibiotics (unknown names are ignored)."""
+    mask = np.uint64(0)
+    for name in names:
+        mask |= ABX_BIT.get(name, np.uint64(0))
+    return mask
+
+
+CLASS_MASKS = {cls: abx_mask(names) for cls, names in ABX_CLASSES.items()}
+
+
+def antibiotic_class_table() -> pd.DataFrame:
+    """Antibiotic → class, with the antibiotic's bit (one row per canonical antibiotic)."""
+    cls_of = {abx: cls for cls, names in ABX_CLASSES.items() for abx in names}
+    return pd.DataFrame({
+        'Antimicrobial': ANTIBIOTICS,
+        'Class': [cls_of.get(a, 'Other') for a in ANTIBIOTICS],
+        'Bit': range(len(ANTIBIOTICS)),
+    })
+
+
+def antibiotic_names(mask) -> list:
+    """Canonical antibiotics in one bitmask, in vocabulary order."""
+    mask = int(mask)
+    return [name for i, name in enumerate(ANTIBIOTICS) if mask >> i & 1]
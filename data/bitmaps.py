@@ -0,0 +1,116 @@
+import threading
+import numpy as np
+import pandas as pd
+
+
+class FilterIndex:
+    """
+    Bitmap inverted index over the filter columns of a cleaned frame, built once
+    per dataset.
+
+    For every column it keeps the sorted distinct values and the per-row value
+    codes; columns with at most _AND_MAX_VALUES values also get a packed bitmap of
+    row positions per value (np.packbits, 1 bit per row). Wider columns (HCF_ID,
+    facility on national extracts) are resolved from their codes instead, which
+    keeps building and holding the index O(rows) per column.
+    A filter selection ({column: [values]}) resolves to OR within a column and
+    AND across columns on the bitmaps, then one row take; the cost depends on
+    the number of selected values, not on re-scanning every column of the frame.
+    Column masks and cascading option lists are memoized, so a rerun with an
+    unchanged selection does no array work at all. One index is shared by all
+    sessions on a dataset, so the memos are updated under a lock.
+    """
+
+    _MEMO_SIZE = 64
+    _AND_MAX_VALUES = 64   # up to this many values a column gets per-value bitmaps (options by AND)
+
+    def __init__(self, df: pd.DataFrame, columns: list):
+        self.n = len(df)
+        self.columns = [c for c in columns if c in df.columns]
+        self.values = {}    # col -> sorted distinct values (missing excluded)
+        self.bitmaps = {}   # col -> uint8 array (n_values, ceil(n / 8)), narrow columns only
+        self.notna = {}     # col -> packed bitmap of non-missing rows
+        self.codes = {}     # col -> value code per row (-1 = missing)
+        for c in self.columns:
+            codes, uniques = pd.factorize(df[c], sort=True)
+            self.values[c] = uniques.tolist()
+            self.codes[c] = codes
+            self.notna[c] = np.packbits(codes >= 0)
+            if len(uniques) <= self._AND_MAX_VALUES:
+                self.bitmaps[c] = np.stack([np.packbits(codes == k) for k in range(len(uniques))]) \
+                    if len(uniques) else np.zeros((0, (self.n + 7) // 8), dtype=np.uint8)
+        self._masks = {}
+        self._options = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(selections: dict):
+        return frozenset((c, frozenset(v)) for c, v in selections.items())
+
+    def _remember(self, memo: dict, key, value):
+        with self._lock:
+            while len(memo) >= self._MEMO_SIZE:
+                memo.pop(next(iter(memo)))
+            memo[key] = value
+        return value
+
+    def column_mask(self, col: str, selected) -> np.ndarray:
+        """Packed bitmap of rows whose `col` value is in `selected` (missing values never match)."""
+        key = (col, frozenset(selected))
+        mask = self._masks.get(key)
+        if mask is not None:
+            return mask
+        pos = {v: i for i, v in enumerate(self.values[col])}
+        chosen = np.zeros(len(pos), dtype=bool)
+        chosen[[pos[v] for v in key[1] if v in pos]] = True
+        if col not in self.bitmaps:
+            # wide column: look the codes up in the selection (code -1 -> last slot, never chosen)
+            mask = np.packbits(np.append(chosen, False)[self.codes[col]])
+            return self._remember(self._masks, key, mask)
+        bitmaps = self.bitmaps[col]
+        if chosen.sum() > len(chosen) // 2:
+            # mostly selected: all non-missing rows minus the few unselected values
+            mask = self.notna[col] & ~np.bitwise_or.reduce(bitmaps[~chosen], axis=0) if (~chosen).any() \
+                else self.notna[col]
+        elif chosen.any():
+            mask = np.bitwise_or.reduce(bitmaps[chosen], axis=0)
+        else:
+            mask = np.zeros(bitmaps.shape[1], dtype=np.uint8)
+        return self._remember(self._masks, key, mask)
+
+    def mask(self, selections: dict):
+        """Packed bitmap of rows matching every column selection; None = all rows."""
+        mask = None
+        for col, selected in selections.items():
+            if col not in self.values:
+                continue
+            m = self.column_mask(col, selected)
+            mask = m if mask is None else mask & m
+        return mask
+
+    def options(self, col: str, selections: dict = None) -> list:
+        """Sorted values of `col` present in the rows matching `selections` (cascading filters)."""
+        selections = selections or {}
+        key = (col, self._key(selections))
+        opts = self._options.get(key)
+        if opts is not None:
+            return opts
+        mask = self.mask(selections)
+        if mask is None:
+            opts = list(self.values[col])
+        else:
+            if col in self.bitmaps:
+                present = (self.bitmaps[col] & mask).any(axis=1)
+            else:
+                # many values: one pass over the codes of the matching rows
+                codes = self.codes[col][np.unpackbits(mask, count=self.n).view(bool)]
+                present = np.bincount(codes[codes >= 0], minlength=len(self.values[col])) > 0
+            opts = [v for v, p in zip(self.values[col], present) if p]
+        return self._remember(self._options, key, opts)
+
+    def rows(self, selections: dict):
+        """Row positions matching `selections`, or None when nothing is filtered."""
+        mask = self.mask(selections)
+        if mask is None:
+            return None
+        return np.flatnonzero(np.unpackbits(mask, count=self.n))
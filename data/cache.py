@@ -0,0 +1,110 @@
+import os
+import glob
+import shutil
+import hashlib
+import functools
+import pandas as pd
+from .store import arrow_safe
+
+# Source files whose content defines what "cleaned" means; editing any of them
+# changes the fingerprint and so invalidates every cached dataset.
+CLEANER_MODULES = ["cleaners.py", "rules.py", "dates.py", "engine.py", "categories.py", "pipeline.py", "age.py"]
+_DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def file_digest(data: bytes) -> str:
+    """Fast content hash of uploaded file bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+@functools.lru_cache(maxsize=1)
+def rules_fingerprint() -> str:
+    """Version fingerprint of the cleaner rules (hash of the cleaning modules' source)."""
+    h = hashlib.blake2b(digest_size=8)
+    for name in CLEANER_MODULES:
+        with open(os.path.join(_DATA_DIR, name), "rb") as fh:
+            h.update(fh.read())
+    return h.hexdigest()
+
+
+def cache_key(data: bytes, kind: str = "") -> str:
+    """Content address of a cleaned dataset: file bytes + reader kind (e.g. 'csv') + cleaner version."""
+    return "-".join(p for p in (file_digest(data), kind, rules_fingerprint()) if p)
+
+
+def _path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, f"{key}.parquet")
+
+
+def cache_get(cache_dir: str, key: str):
+    """Cleaned frame for `key`, or None. A hit marks the entry as recently used."""
+    path = _path(cache_dir, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        df = pd.read_parquet(path)
+    except Exception:
+        return None
+    os.utime(path)
+    return df
+
+
+def cache_put(cache_dir: str, key: str, df: pd.DataFrame, max_bytes: int) -> None:
+    """Store `df` under `key` (written atomically), then evict least-recently-used entries above max_bytes."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _path(cache_dir, key)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    safe = arrow_safe(df)
+    safe.attrs = dict(df.attrs)  # JSON-able attrs (cleaning report) are kept in the Parquet metadata
+    safe.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    evict(cache_dir, max_bytes, keep=key)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def evict(cache_dir: str, max_bytes: int, keep: str = None, pattern: str = "*.parquet") -> list:
+    """
+    Delete least-recently-used entries until the cache fits in max_bytes. Returns
+    removed keys (names matching `pattern`, minus its suffix). Entries may be
+    directories (e.g. stores): their size is their files', their age their own mtime.
+    """
+    suffix = pattern.lstrip("*")
+    entries = []
+    for path in glob.glob(os.path.join(cache_dir, pattern)):
+        if path.endswith(".tmp"):
+            continue
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        size = _dir_size(path) if os.path.isdir(path) else st.st_size
+        entries.append((st.st_mtime, size, path))
+    total = sum(size for _, size, _ in entries)
+    removed = []
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        key = os.path.basename(path)
+        key = key[:-len(suffix)] if suffix else key
+        if key == keep:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+        removed.append(key)
+    return removed
@@ -0,0 +1,56 @@
+import pandas as pd
+from .cleaners import (
+    ABX_MAP, ABX_TOKEN_RULES, ABX_SUBSTRING_RULES, SPECIMEN_RULES,
+    PATHOGEN_CODES, PATHOGEN_RULES
+)
+
+UNKNOWN = "Unknown"
+
+# Fixed category vocabularies of the cleaned columns (everything the cleaners
+# can produce, plus 'Unknown' from patient completion). Sorted, so grouping on
+# the codes gives the same order as grouping the strings did.
+VOCABULARIES = {
+    'gender_clean':      sorted(["Female", "Male", UNKNOWN]),
+    'patienttype_clean': sorted(["Inpatient", "Outpatient", UNKNOWN]),
+    'sir_clean':         sorted(["S", "I", "R", UNKNOWN]),
+    'age_type':          sorted(["Years", "Months", "Weeks", "Days", "Hours", UNKNOWN]),
+    'antibiotic_clean':  sorted(set(ABX_MAP.values())
+                                | {r for r, _ in ABX_TOKEN_RULES + ABX_SUBSTRING_RULES}),
+    'specimen_clean':    sorted({r for r, _ in SPECIMEN_RULES} | {UNKNOWN}),
+    'pathogen_clean':    sorted(set(PATHOGEN_CODES.values()) | {r for r, _ in PATHOGEN_RULES} | {UNKNOWN}),
+    'facility_clean':    [UNKNOWN],
+    'hcf_id_clean':      [UNKNOWN],
+}
+
+# These keep unmatched input (title-cased specimen/pathogen, free-text facility
+# names): values outside the base vocabulary are added, sorted, per dataset.
+OPEN_VOCABULARIES = ['specimen_clean', 'pathogen_clean', 'facility_clean', 'hcf_id_clean']
+
+
+def vocabulary(col: str, values=()) -> list:
+    """Categories for `col`: its base vocabulary, plus `values` if the vocabulary is open."""
+    base = VOCABULARIES[col]
+    if col not in OPEN_VOCABULARIES:
+        return base
+    return sorted(set(base).union(v for v in values if pd.notna(v)))
+
+
+def encode_categories(df: pd.DataFrame, categories: dict = None) -> pd.DataFrame:
+    """
+    Every column in VOCABULARIES as a categorical over a fixed, sorted vocabulary
+    (int8 codes for the small ones, e.g. sir_clean; values outside a closed
+    vocabulary become missing). Pass `categories` ({col: list}) to force the
+    vocabularies, e.g. to give several chunks identical dtypes before concat.
+    """
+    df = df.copy()
+    categories = categories or {}
+    for col in VOCABULARIES:
+        if col not in df.columns:
+            continue
+        s = df[col]
+        cats = categories.get(col)
+        if cats is None:
+            seen = s.cat.categories if isinstance(s.dtype, pd.CategoricalDtype) else s.dropna().unique()
+            cats = vocabulary(col, seen)
+        df[col] = s.astype(pd.CategoricalDtype(cats))
+    return df
@@ -1,6 +1,8 @@
 import re
 import pandas as pd
 import numpy as np
+from .rules import RuleMatcher
+from .age import age_in_years, age_bands_5y
 
 ABX_MAP = {
     'ampicillin':'Ampicillin','amp':'Ampicillin',
@@ -76,6 +78,92 @@ def parse_age(val):
     if "d" in present:  return round(days, 1), "Days"
     return round(days*24, 1), "Hours"
 
+# Vectorized parse_age: same rules, compiled once, applied through the .str accessor
+_AGE_NULLS = ["", "nan", "na", "none", "null"]
+_AGE_SUBS = [
+    (re.compile(r'(?<=\d)(?=[a-z])'), ' '),
+    (re.compile(r'(?<=[a-z])(?=\d)'), ' '),
+    (re.compile(r'[^0-9a-z\s]'), ' '),
+    (re.compile(r'\s+'), ' '),
+]
+_AGE_UNIT_SUBS = [
+    (re.compile(r'\byears?\b|\byrs?\b|\by\b'), 'y'),
+    (re.compile(r'\bmonths?\b|\bmnths?\b|\bmths?\b|\bmos?\b|\bmo\b'), 'mo'),
+    (re.compile(r'\bweeks?\b|\bwks?\b|\bwk\b|\bw\b'), 'w'),
+    (re.compile(r'\bdays?\b|\bdys?\b|\bdy\b|\bd\b'), 'd'),
+    (re.compile(r'\bhours?\b|\bhrs?\b|\bhr\b|\bh\b'), 'h'),
+    (re.compile(r'(\d+)\s*m\b'), r'\1 mo'),
+]
+_AGE_PAIR = re.compile(r'(\d+)\s*(y|mo|w|d|h)\b')
+_AGE_DAYS = {"y": 365.25, "mo": 30.4375, "w": 7.0, "d": 1.0}
+# unit present -> (divisor applied to days, decimals, label); checked in this order
+_AGE_OUT = [("y", 365.25, 3, "Years"), ("mo", 30.4375, 1, "Months"),
+            ("w", 7.0, 1, "Weeks"), ("d", 1.0, 1, "Days")]
+
+def _round_like_python(x: np.ndarray, ndigits: int) -> np.ndarray:
+    """np.round, except near-ties are re-rounded with round() so results match parse_age bit for bit."""
+    out = np.round(x, ndigits)
+    scaled = x * 10.0**ndigits
+    tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if tie.any():
+        out[tie] = [round(float(v), ndigits) for v in x[tie]]
+    return out
+
+def parse_age_series(s: pd.Series) -> pd.DataFrame:
+    """
+    Vectorized parse_age over a whole Series.
+
+    Returns a DataFrame on s.index with columns:
+      age_value (Float64) | age_type ("Years"/"Months"/"Weeks"/"Days"/"Hours" or <NA>)
+
+    Every value gives the same result as parse_age; no per-row tuples are built.
+    """
+    index = s.index
+    s = s.reset_index(drop=True)
+    value = pd.Series(np.nan, index=s.index, dtype="float64")
+    unit = pd.Series(pd.NA, index=s.index, dtype=object)
+
+    v = s[s.notna()].astype(str).str.strip().str.lower()
+    v = v[~v.isin(_AGE_NULLS)]
+    for pat, rep in _AGE_SUBS:
+        v = v.str.replace(pat, rep, regex=True)
+    v = v.str.strip().str.replace('monthsm', 'months', regex=False)
+    for pat, rep in _AGE_UNIT_SUBS:
+        v = v.str.replace(pat, rep, regex=True)
+
+    pairs = v.str.extractall(_AGE_PAIR)
+    if not pairs.empty:
+        n = pairs[0].astype(float).to_numpy()
+        u = pairs[1].to_numpy()
+        contrib = np.where(u == "h", n / 24, n * pd.Series(u).map(_AGE_DAYS).fillna(0.0).to_numpy())
+        # add matches in text order, exactly like the scalar loop
+        wide = pd.Series(contrib, index=pairs.index).unstack("match")
+        days = pd.Series(0.0, index=wide.index)
+        for k in wide.columns:
+            days = days + wide[k].fillna(0.0)
+        present = pd.get_dummies(pd.Series(u, index=pairs.index.get_level_values(0))).groupby(level=0).any()
+
+        done = pd.Series(False, index=days.index)
+        for code, div, nd, label in _AGE_OUT:
+            if code not in present.columns:
+                continue
+            hit = present[code].reindex(days.index, fill_value=False) & ~done
+            idx = days.index[hit]
+            value.loc[idx] = _round_like_python((days[hit] / div).to_numpy(), nd)
+            unit.loc[idx] = label
+            done |= hit
+        idx = days.index[~done]  # hours only
+        value.loc[idx] = _round_like_python((days[~done] * 24).to_numpy(), 1)
+        unit.loc[idx] = "Hours"
+
+    bare = v.drop(pairs.index.get_level_values(0).unique())
+    bare = bare[bare.str.fullmatch(r'\d+')]
+    value.loc[bare.index] = bare.astype(float).to_numpy()
+    unit.loc[bare.index] = "Years"
+
+    out = pd.DataFrame({"age_value": value.astype("Float64"), "age_type": unit})
+    return out.set_axis(index)
+
 #Making age bands
 def add_age_band_5y(df, value_col="age_value", type_col="age_type",
                     out_col="age_band_5y", years_col=None, max_years=120):
@@ -109,59 +197,15 @@ def add_age_band_5y(df, value_col="age_value", type_col="age_type",
         The same DataFrame with a new categorical column `out_col`.
     """
 
-    # 1) Convert all ages to YEARS
-    factor = {
-        "Years": 1.0,
-        "Months": 1.0 / 12.0,
-        "Weeks": 1.0 / 52.1775,
-        "Days": 1.0 / 365.25,
-        "Hours": 1.0 / (24 * 365.25),
-    }
-
-    # Map unit -> factor; coerce non-numerics to NaN
-    s_units = df[type_col].map(factor)
-    s_vals = pd.to_numeric(df[value_col], errors="coerce")
-    age_years = s_vals * s_units
-
-    # Clean absurd values
-    age_years = age_years.where((age_years >= 0) & (age_years <= float(max_years)))
+    # 1) Convert all ages to YEARS (shared unit table, see data/age.py)
+    age_years = age_in_years(df[value_col], df[type_col], max_years=max_years)
 
     # Optionally keep the computed years
     if years_col:
         df[years_col] = age_years
 
-    # 2) Define bins & labels
-    bins = [-np.inf, 1, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65, 70, 75, 80, 85, np.inf]
-    labels = [
-        "0–1 Years",   # [0,1)
-        "1–4 Years",   # [1,5)
-        "5–9 Years",
-        "10–14 Years",
-        "15–19 Years",
-        "20–24 Years",
-        "25–29 Years",
-        "30–34 Years",
-        "35–39 Years",
-        "40–44 Years",
-        "45–49 Years",
-        "50–54 Years",
-        "55–59 Years",
-        "60–64 Years",
-        "65–69 Years",
-        "70–74 Years",
-        "75–79 Years",
-        "80–84 Years",
-        "85+ Years"    # [85, ∞)
-    ]
-
-    # 3) Cut into bands
-    df[out_col] = pd.cut(
-        age_years,
-        bins=bins,
-        labels=labels,
-        right=False,          # [lower, upper)
-        include_lowest=True
-    ).astype("string")
+    # 2) Cut into bands ([lower, upper), 85+ open-ended)
+    df[out_col] = age_bands_5y(age_years).astype("string")
 
     return df
 
@@ -170,7 +214,6 @@ def add_age_band_5y(df, value_col="age_value", type_col="age_type",
 
 
 def clean_patienttype(val):
-    import pandas as pd, re
     if pd.isna(val): return pd.NA
     v = re.sub(r'[^a-z]', '', str(val).strip().lower())
     if v in {"outpatient","outpatients","outpt","opd"} or v.startswith("outpat"):
@@ -181,27 +224,96 @@ def clean_patienttype(val):
     if v.startswith("in"):  return "Inpatient"
     return pd.NA
 
+# Rule tables: (result, [literal sets]); first rule with a fully present set wins.
+SPECIMEN_RULES = [
+    ('Blood',                           [{'blood'}]),
+    ('Urine',                           [{'urine'}]),
+    ('Sputum',                          [{'sputum'}]),
+    ('Throat swab',                     [{'throat', 'swab'}]),
+    ('Tracheal aspirate',               [{'tracheal'}]),
+    ('Catheter tip',                    [{'catheter', 'tip'}]),
+    ('Shunt tip',                       [{'shunt', 'tip'}]),
+    ('Ascitic fluid',                   [{'ascitic'}]),
+    ('Hydrocele fluid',                 [{'hydrocele'}]),
+    ('Genital swab',                    [{'genital'}, {'urogenital'}]),
+    ('Pus',                             [{'pus'}, {'purulent'}]),
+    ('Lower respiratory (unspecified)', [{'lowresp'}]),
+]
+
+# whole-token combinations, checked before the token-by-token ABX_MAP lookup
+ABX_TOKEN_RULES = [
+    ('Amoxicillin-clavulanate', [{'amoxicillin', 'clavulanic'}]),
+    ('Penicillin G',            [{'penicillin', 'g'}]),
+]
+
+# substring fallbacks, checked after the ABX_MAP lookups
+ABX_SUBSTRING_RULES = [
+    ('Ciprofloxacin',   [{'cipro'}]),
+    ('Gentamicin',      [{'gentamyc'}]),
+    ('Ceftriaxone',     [{'ceftriax'}]),
+    ('Cefepime',        [{'cefepim'}]),
+    ('Cefotaxime',      [{'cefotax'}]),
+    ('Ceftazidime',     [{'ceftazid'}]),
+    ('Cefuroxime',      [{'cefurox'}]),
+    ('Meropenem',       [{'meropen'}]),
+    ('Imipenem',        [{'imipen'}, {'ipm'}]),
+    ('Ertapenem',       [{'ertapen'}]),
+    ('Vancomycin',      [{'vancom'}]),
+    ('Azithromycin',    [{'azithro'}]),
+    ('Erythromycin',    [{'erythro'}]),
+    ('Clindamycin',     [{'clinda'}]),
+    ('Chloramphenicol', [{'chloramph'}]),
+    ('Co-trimoxazole',  [{'co trim'}, {'cotrim'}, {'sxt'}]),
+    ('Nalidixic acid',  [{'nalidix'}]),
+    ('Norfloxacin',     [{'norflox'}]),
+]
+
+# WHONET-style organism codes, matched on the value with spaces removed
+PATHOGEN_CODES = {
+    'klepne':'Klebsiella pneumoniae',
+    'klepoxy':'Klebsiella oxytoca',
+    'staaur':'Staphylococcus aureus',
+    'staepi':'Staphylococcus epidermidis',
+    'stasap':'Staphylococcus saprophyticus',
+    'pseaer':'Pseudomonas aeruginosa',
+    'entclo':'Enterobacter cloacae',
+    'stenmal':'Stenotrophomonas maltophilia',
+    'esccol':'Escherichia coli',
+    'nlf':'Non-lactose fermenters (unspecified)',
+    'nlfc':'Non-lactose fermenters (unspecified)',
+    'lfc':'Lactose fermenters (unspecified)',
+}
+
+PATHOGEN_RULES = [
+    ('Klebsiella pneumoniae',        [{'klebsiella', 'pneumon'}, {'klebsiella', 'pnuemon'}]),
+    ('Klebsiella oxytoca',           [{'klebsiella', 'oxytoca'}]),
+    ('Escherichia coli',             [{'escherich', 'coli'}, {'eschericia', 'coli'}]),
+    ('Staphylococcus aureus',        [{'staphylococcus', 'aure'}]),
+    ('Staphylococcus epidermidis',   [{'staphylococcus', 'epiderm'}, {'staphylococcus', 'epi'}]),
+    ('Staphylococcus saprophyticus', [{'staphylococcus', 'saproph'}]),
+    ('Streptococcus pneumoniae',     [{'streptococcus', 'pneumon'}]),
+    ('Salmonella Typhi',             [{'salmonella typhi'}]),
+    ('Salmonella Group D',           [{'salmonella', 'group d'}]),
+    ('Pseudomonas aeruginosa',       [{'pseudomonas', 'aeruginosa'}]),
+    ('Enterobacter cloacae',         [{'enterobacter cloacae'}]),
+    ('Enterobacter spp',             [{'enterobacter'}]),
+    ('Neisseria gonorrhoeae',        [{'neisseria', 'gonorrhoe'}]),
+    ('Neisseria spp',                [{'neisseria', 'spp'}, {'neisseria', 'species'}]),
+]
+
+# compiled once at import
+_SPECIMEN_MATCHER = RuleMatcher(SPECIMEN_RULES)
+_ABX_TOKEN_MATCHER = RuleMatcher(ABX_TOKEN_RULES, mode="token")
+_ABX_SUBSTRING_MATCHER = RuleMatcher(ABX_SUBSTRING_RULES)
+_PATHOGEN_MATCHER = RuleMatcher(PATHOGEN_RULES)
+
 def clean_specimen(val):
-    import pandas as pd, re
     if pd.isna(val): return pd.NA
     v = str(val).strip().lower().replace('_',' ').replace('-',' ')
     v = re.sub(r'\s+', ' ', v)
-    if 'blood' in v:                      return 'Blood'
-    if 'urine' in v:                      return 'Urine'
-    if 'sputum' in v:                     return 'Sputum'
-    if 'throat' in v and 'swab' in v:     return 'Throat swab'
-    if 'tracheal' in v:                   return 'Tracheal aspirate'
-    if 'catheter' in v and 'tip' in v:    return 'Catheter tip'
-    if 'shunt' in v and 'tip' in v:       return 'Shunt tip'
-    if 'ascitic' in v:                    return 'Ascitic fluid'
-    if 'hydrocele' in v:                  return 'Hydrocele fluid'
-    if 'genital' in v or 'urogenital' in v: return 'Genital swab'
-    if 'pus' in v or 'purulent' in v:     return 'Pus'
-    if 'lowresp' in v:                    return 'Lower respiratory (unspecified)'
-    return v.title()
+    return _SPECIMEN_MATCHER.match(v) or v.title()
 
 def clean_gender(val):
-    import pandas as pd, re
     if pd.isna(val): return pd.NA
     v = re.sub(r'[^a-z]', '', str(val).strip().lower())
     if v == "": return pd.NA
@@ -210,7 +322,6 @@ def clean_gender(val):
     return pd.NA
 
 def clean_sir(val):
-    import pandas as pd, re
     if pd.isna(val): return pd.NA
     v = str(val).strip().lower()
     if v in {"", "na", "n/a", "none", "null"}: return pd.NA
@@ -222,79 +333,29 @@ def clean_sir(val):
     return m.group(1).upper() if m else pd.NA
 
 def clean_antibiotic(val):
-    import pandas as pd, re
     if pd.isna(val): return pd.NA
     s = str(val).strip()
     v = s.lower().replace('-', ' ')
     v = re.sub(r'\s+', ' ', v).strip()
-    tokens = v.split()
     if v in ABX_MAP: return ABX_MAP[v]
-    if 'amoxicillin' in tokens and 'clavulanic' in tokens: return 'Amoxicillin-clavulanate'
-    if 'penicillin' in tokens and 'g' in tokens: return 'Penicillin G'
+    tokens = v.split()
+    hit = _ABX_TOKEN_MATCHER.match(v)
+    if hit: return hit
     for t in tokens:
         if t in ABX_MAP: return ABX_MAP[t]
-    if 'cipro' in v: return 'Ciprofloxacin'
-    if 'gentamyc' in v: return 'Gentamicin'
-    if 'ceftriax' in v: return 'Ceftriaxone'
-    if 'cefepim' in v: return 'Cefepime'
-    if 'cefotax' in v: return 'Cefotaxime'
-    if 'ceftazid' in v: return 'Ceftazidime'
-    if 'cefurox' in v: return 'Cefuroxime'
-    if 'meropen' in v: return 'Meropenem'
-    if 'imipen' in v or 'ipm' in v: return 'Imipenem'
-    if 'ertapen' in v: return 'Ertapenem'
-    if 'vancom' in v: return 'Vancomycin'
-    if 'azithro' in v: return 'Azithromycin'
-    if 'erythro' in v: return 'Erythromycin'
-    if 'clinda' in v: return 'Clindamycin'
-    if 'chloramph' in v: return 'Chloramphenicol'
-    if 'co trim' in v or 'cotrim' in v or 'sxt' in v: return 'Co-trimoxazole'
-    if 'nalidix' in v: return 'Nalidixic acid'
-    if 'norflox' in v or v == 'nor': return 'Norfloxacin'
-    if v == 'pg': return 'Penicillin G'
-    return pd.NA
+    return _ABX_SUBSTRING_MATCHER.match(v, default=pd.NA)
 
 def clean_pathogen(val):
-    import pandas as pd, re
     if pd.isna(val): return pd.NA
     raw = str(val).strip()
     v = raw.lower()
     v = re.sub(r'[^a-z0-9\s]', ' ', v)
     v = re.sub(r'\s+', ' ', v).strip()
     vc = v.replace(' ','')
-    code_map = {
-        'klepne':'Klebsiella pneumoniae',
-        'klepoxy':'Klebsiella oxytoca',
-        'staaur':'Staphylococcus aureus',
-        'staepi':'Staphylococcus epidermidis',
-        'stasap':'Staphylococcus saprophyticus',
-        'pseaer':'Pseudomonas aeruginosa',
-        'entclo':'Enterobacter cloacae',
-        'stenmal':'Stenotrophomonas maltophilia',
-        'esccol':'Escherichia coli',
-        'nlf':'Non-lactose fermenters (unspecified)',
-        'nlfc':'Non-lactose fermenters (unspecified)',
-        'lfc':'Lactose fermenters (unspecified)',
-    }
-    if vc in code_map: return code_map[vc]
-    if 'klebsiella' in v and ('pneumon' in v or 'pnuemon' in v): return 'Klebsiella pneumoniae'
-    if 'klebsiella' in v and 'oxytoca' in v: return 'Klebsiella oxytoca'
-    if ('escherich' in v or 'eschericia' in v) and 'coli' in v: return 'Escherichia coli'
-    if 'staphylococcus' in v and 'aure' in v: return 'Staphylococcus aureus'
-    if 'staphylococcus' in v and ('epiderm' in v or 'epi' in v): return 'Staphylococcus epidermidis'
-    if 'staphylococcus' in v and 'saproph' in v: return 'Staphylococcus saprophyticus'
-    if 'streptococcus' in v and 'pneumon' in v: return 'Streptococcus pneumoniae'
-    if 'salmonella typhi' in v: return 'Salmonella Typhi'
-    if 'salmonella' in v and 'group d' in v: return 'Salmonella Group D'
-    if 'pseudomonas' in v and 'aeruginosa' in v: return 'Pseudomonas aeruginosa'
-    if 'enterobacter cloacae' in v: return 'Enterobacter cloacae'
-    if 'enterobacter' in v: return 'Enterobacter spp'
-    if 'neisseria' in v and 'gonorrhoe' in v: return 'Neisseria gonorrhoeae'
-    if 'neisseria' in v and ('spp' in v or 'species' in v): return 'Neisseria spp'
-    return raw.title()
+    if vc in PATHOGEN_CODES: return PATHOGEN_CODES[vc]
+    return _PATHOGEN_MATCHER.match(v) or raw.title()
 
 def clean_year(val):
-    import pandas as pd, re
     if pd.isna(val): return pd.NA
     s = str(val).strip()
     y = pd.to_datetime(s, errors='coerce', dayfirst=True)
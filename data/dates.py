@@ -0,0 +1,106 @@
+import re
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype
+
+# Value shape -> explicit strptime format. A shape is the raw string with every
+# digit run of length 1–2 written as "99", longer digit runs as one "9" per
+# digit, and every letter as "a" (so "7/1/2025" and "07/01/2025" share a shape).
+# Day-first, like the dayfirst=True parsing it replaces.
+DATE_FORMATS = {
+    "99/99/9999": "%d/%m/%Y",
+    "99-99-9999": "%d-%m-%Y",
+    "99.99.9999": "%d.%m.%Y",
+    "99/99/99": "%d/%m/%y",
+    "99/99/9999 99:99": "%d/%m/%Y %H:%M",
+    "99/99/9999 99:99:99": "%d/%m/%Y %H:%M:%S",
+    "9999-99-99": "%Y-%m-%d",
+    "9999/99/99": "%Y/%m/%d",
+    "9999-99-99 99:99": "%Y-%m-%d %H:%M",
+    "9999-99-99 99:99:99": "%Y-%m-%d %H:%M:%S",
+    "9999-99-99a99:99:99": "%Y-%m-%dT%H:%M:%S",
+    "99-aaa-9999": "%d-%b-%Y",
+    "99 aaa 9999": "%d %b %Y",
+    "99-aaa-99": "%d-%b-%y",
+    "9999": "%Y",
+    "99999999": "%Y%m%d",
+}
+
+# Excel serial day numbers (1954–2119), e.g. "45678" or "45678.5"
+_EXCEL_SERIAL = re.compile(r"^9{5}(?:\.9+)?$")
+_EXCEL_ORIGIN = "1899-12-30"
+_EXCEL_RANGE = (20000, 80000)
+
+_SHORT_RUN = re.compile(r"(?<!\d)\d{1,2}(?!\d)")
+_DIGIT = re.compile(r"\d")
+_LETTER = re.compile(r"[A-Za-z]")
+_YEAR = re.compile(r"((?:19|20)\d{2})")
+
+
+def date_shapes(s: pd.Series) -> pd.Series:
+    """Shape pattern of each (string) value, used to pick one explicit format per group."""
+    return (s.str.replace(_SHORT_RUN, "99", regex=True)
+             .str.replace(_DIGIT, "9", regex=True)
+             .str.replace(_LETTER, "a", regex=True))
+
+
+def _from_excel_serial(values: pd.Series) -> pd.Series:
+    num = pd.to_numeric(values, errors="coerce")
+    num = num.where((num >= _EXCEL_RANGE[0]) & (num <= _EXCEL_RANGE[1]))
+    return pd.to_datetime(num, unit="D", origin=_EXCEL_ORIGIN, errors="coerce")
+
+
+def parse_dates(s: pd.Series, excel_serials: bool = True) -> pd.Series:
+    """
+    Parse a mixed-format date column into datetime64[ns].
+
+    Values are grouped by shape (see DATE_FORMATS) and each group is parsed with
+    one explicit vectorized format. Excel serial numbers are converted from the
+    1899-12-30 origin. Shapes without a known format fall back to pandas'
+    day-first inference for that group only. Unparseable values become NaT.
+    """
+    if is_datetime64_any_dtype(s):
+        return pd.to_datetime(s, errors="coerce")
+    index = s.index
+    s = s.reset_index(drop=True)
+    out = pd.Series(pd.NaT, index=s.index, dtype="datetime64[ns]")
+    if is_numeric_dtype(s) and not s.dtype == bool:
+        if excel_serials:
+            out[:] = _from_excel_serial(s)
+        return out.set_axis(index)
+
+    v = s[s.notna()].astype(str).str.strip()
+    v = v[v != ""]
+    if v.empty:
+        return out.set_axis(index)
+    shapes = date_shapes(v)
+    for shape, idx in v.groupby(shapes, sort=False).groups.items():
+        vals = v.loc[idx]
+        fmt = DATE_FORMATS.get(shape)
+        if fmt is not None:
+            parsed = pd.to_datetime(vals, format=fmt, errors="coerce")
+        elif _EXCEL_SERIAL.match(shape):
+            if not excel_serials:
+                continue
+            parsed = _from_excel_serial(vals)
+        else:
+            parsed = pd.to_datetime(vals, errors="coerce", dayfirst=True, format="mixed")
+        out.loc[idx] = parsed.to_numpy(dtype="datetime64[ns]")
+    return out.set_axis(index)
+
+
+def parse_years(s: pd.Series, dates: pd.Series = None) -> pd.Series:
+    """
+    Vectorized clean_year: year of the parsed value when it lies in 1900–2100,
+    else the first 19xx/20xx found in the text. Where that still gives nothing
+    and `dates` (e.g. sample_date_clean, same index) is provided, its year is used.
+
+    Returns an Int64 Series.
+    """
+    years = parse_dates(s, excel_serials=False).dt.year.astype("Int64")
+    years = years.where((years >= 1900) & (years <= 2100))
+    text = s[s.notna()].astype(str).str.strip()
+    found = pd.to_numeric(text.str.extract(_YEAR, expand=False), errors="coerce").astype("Int64")
+    years = years.fillna(found.reindex(s.index))
+    if dates is not None:
+        years = years.fillna(dates.dt.year.astype("Int64"))
+    return years.astype("Int64")
@@ -0,0 +1,80 @@
+import time
+import numpy as np
+import pandas as pd
+from profiling import stage
+
+
+def map_unique(s: pd.Series, func, vectorized: bool = False):
+    """
+    Apply `func` to the distinct values of `s` only and broadcast the results
+    back to every row through the factorized integer codes.
+
+    - vectorized=False: `func` is a scalar cleaner (called once per distinct value).
+    - vectorized=True:  `func` takes a Series of distinct values and returns a
+      Series or DataFrame aligned with it (e.g. parse_age_series).
+
+    Missing values are kept as their own distinct value, so cleaners see them
+    exactly as Series.apply would.
+
+    Returns (result, n_distinct) where result is a Series/DataFrame on s.index.
+    """
+    codes, uniques = pd.factorize(s, use_na_sentinel=False)
+    uniques = pd.Series(uniques, dtype=object)
+    if vectorized:
+        out = func(uniques)
+        if isinstance(out, pd.DataFrame):
+            res = out.take(codes).set_axis(s.index)
+        else:
+            res = pd.Series(out.to_numpy().take(codes), index=s.index, name=s.name, dtype=out.dtype)
+    else:
+        vals = np.empty(len(uniques), dtype=object)
+        vals[:] = [func(v) for v in uniques]
+        res = pd.Series(vals.take(codes), index=s.index, name=s.name, dtype=object)
+    return res, len(uniques)
+
+
+def _unzipped(func, width: int):
+    """Turn a scalar cleaner returning a `width`-tuple into a vectorized one."""
+    def wrapper(values: pd.Series) -> pd.DataFrame:
+        cols = [np.empty(len(values), dtype=object) for _ in range(width)]
+        for i, v in enumerate(values):
+            for col, part in zip(cols, func(v)):
+                col[i] = part
+        return pd.DataFrame(dict(enumerate(cols)), index=values.index)
+    return wrapper
+
+
+def run_cleaners(df: pd.DataFrame, steps) -> pd.DataFrame:
+    """
+    Run a list of cleaning steps against `df` (in place) through map_unique.
+
+    steps: iterable of (source_col, target, func) or (source_col, target, func, vectorized)
+      - target is a column name, or a tuple of column names when `func`
+        returns one value per target (a tuple, or DataFrame columns if vectorized).
+
+    Returns a report with one row per step:
+      column | target | rows | distinct | seconds
+    """
+    rows = []
+    for step in steps:
+        src, target, func = step[:3]
+        vectorized = step[3] if len(step) > 3 else False
+        if isinstance(target, tuple) and not vectorized:
+            func, vectorized = _unzipped(func, len(target)), True
+        label = ", ".join(target) if isinstance(target, tuple) else target
+        t0 = time.perf_counter()
+        with stage(f"clean {label}", rows=len(df)):
+            res, n_distinct = map_unique(df[src], func, vectorized=vectorized)
+            if isinstance(target, tuple):
+                for col_out, col_res in zip(target, res.columns):
+                    df[col_out] = res[col_res]
+            else:
+                df[target] = res
+        rows.append({
+            "column": src,
+            "target": label,
+            "rows": len(df),
+            "distinct": n_distinct,
+            "seconds": round(time.perf_counter() - t0, 4),
+        })
+    return pd.DataFrame(rows, columns=["column", "target", "rows", "distinct", "seconds"])
@@ -0,0 +1,175 @@
+import os
+import gzip
+import hashlib
+import threading
+import pandas as pd
+from pandas.api.types import is_datetime64_dtype
+from .store import arrow_safe
+from .cache import evict, rules_fingerprint
+
+# File formats by file-name extension: (mime type, writer kind)
+EXPORT_FORMATS = {
+    ".csv.gz": ("application/gzip", "csv.gz"),
+    ".csv": ("text/csv", "csv"),
+    ".parquet": ("application/vnd.apache.parquet", "parquet"),
+    ".xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+EXCEL_MAX_ROWS = 1_048_576     # rows per worksheet, header included
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def export_format(file_name: str):
+    """(mime, kind) for a download file name, by extension."""
+    for ext, fmt in EXPORT_FORMATS.items():
+        if file_name.lower().endswith(ext):
+            return fmt
+    raise ValueError(f"Unsupported export format: {file_name}")
+
+
+def _chunks(df: pd.DataFrame, chunk_rows: int):
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _date_formats(df: pd.DataFrame) -> dict:
+    """
+    strftime format per datetime column, fixed over the whole frame: to_csv picks
+    date-only vs date+time per call, which would differ between chunks.
+    """
+    out = {}
+    for c in df.columns:
+        if is_datetime64_dtype(df[c]):
+            s = df[c].dropna()
+            out[c] = "%Y-%m-%d" if (s == s.dt.normalize()).all() else "%Y-%m-%d %H:%M:%S"
+    return out
+
+
+def write_csv(df: pd.DataFrame, path: str, chunk_rows: int = 250_000, compress: bool = False) -> None:
+    """CSV (optionally gzip) written chunk by chunk, never as one in-memory string."""
+    formats = _date_formats(df) if len(df) > chunk_rows else {}
+    opener = gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6) if compress \
+        else open(path, "w", encoding="utf-8", newline="")
+    with opener as fh:
+        for i, chunk in enumerate(_chunks(df, chunk_rows)):
+            if formats:
+                chunk = chunk.assign(**{c: chunk[c].dt.strftime(f) for c, f in formats.items()})
+            chunk.to_csv(fh, index=False, header=(i == 0))
+
+
+def write_parquet(df: pd.DataFrame, path: str, chunk_rows: int = 250_000) -> None:
+    """Parquet written one row group per chunk."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    try:
+        for chunk in _chunks(df, chunk_rows):
+            table = pa.Table.from_pandas(arrow_safe(chunk), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _rows(df: pd.DataFrame, chunk_rows: int):
+    """Row tuples with missing values as None (Excel writers take plain Python values)."""
+    for chunk in _chunks(df, chunk_rows):
+        chunk = chunk.astype(object)
+        yield from chunk.where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def write_xlsx(sheets: dict, path: str, chunk_rows: int = 50_000) -> None:
+    """
+    Workbook with one sheet per {name: frame}, streamed row by row: xlsxwriter in
+    constant_memory mode, or openpyxl write-only when xlsxwriter is missing.
+    Frames longer than an Excel sheet continue on '<name> (2)', ...
+    """
+    try:
+        import xlsxwriter
+    except ImportError:
+        xlsxwriter = None
+    if xlsxwriter is not None:
+        wb = xlsxwriter.Workbook(path, {"constant_memory": True, "nan_inf_to_errors": True,
+                                        "default_date_format": "yyyy-mm-dd", "remove_timezone": True})
+        add_sheet = lambda title: wb.add_worksheet(title)
+    else:
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        add_sheet = lambda title: wb.create_sheet(title)
+
+    for name, df in sheets.items():
+        header = [str(c) for c in df.columns]
+        part, ws, r = 0, None, EXCEL_MAX_ROWS
+        for row in _rows(df, chunk_rows):
+            if r >= EXCEL_MAX_ROWS:
+                part += 1
+                ws = add_sheet(str(name)[:31] if part == 1 else f"{str(name)[:25]} ({part})")
+                r = 0
+                _put(ws, r, header, xlsxwriter); r += 1
+            _put(ws, r, row, xlsxwriter); r += 1
+        if ws is None:
+            _put(add_sheet(str(name)[:31]), 0, header, xlsxwriter)
+
+    if xlsxwriter is not None:
+        wb.close()
+    else:
+        wb.save(path)
+
+
+def _put(ws, r, values, xlsxwriter):
+    if xlsxwriter is not None:
+        ws.write_row(r, 0, values)
+    else:
+        ws.append(list(values))
+
+
+def write_export(frames, path: str, kind: str, chunk_rows: int = 250_000) -> None:
+    """Write a frame (or {sheet: frame} for xlsx) in the given kind ('csv', 'csv.gz', 'parquet', 'xlsx')."""
+    if kind == "xlsx":
+        write_xlsx(frames if isinstance(frames, dict) else {"Sheet1": frames}, path, min(chunk_rows, 50_000))
+        return
+    if isinstance(frames, dict):
+        frames = next(iter(frames.values()))
+    if kind in ("csv", "csv.gz"):
+        write_csv(frames, path, chunk_rows, compress=(kind == "csv.gz"))
+    elif kind == "parquet":
+        write_parquet(frames, path, chunk_rows)
+    else:
+        raise ValueError(f"Unsupported export kind: {kind}")
+
+
+def export_path(export_dir: str, file_name: str, signature) -> str:
+    """Cache path of `file_name` for a dataset/filter signature (any repr-able value) and cleaner version."""
+    key = hashlib.blake2b(repr((signature, rules_fingerprint())).encode("utf-8"), digest_size=10).hexdigest()
+    return os.path.join(export_dir, f"{key}-{file_name}")
+
+
+def export_file(export_dir: str, file_name: str, signature, frames, max_bytes: int,
+                chunk_rows: int = 250_000) -> str:
+    """
+    Path of the exported file, serialized at most once per (signature, file name):
+    later calls reuse the file on disk. `frames` may be a frame, {sheet: frame}
+    or a callable returning one, so nothing is built for a cache hit. The export
+    directory is kept under max_bytes (least recently used files go first).
+    """
+    path = export_path(export_dir, file_name, signature)
+    with _locks_guard:
+        lock = _locks.setdefault(path, threading.Lock())
+    with lock:
+        if os.path.exists(path):
+            os.utime(path)
+            return path
+        os.makedirs(export_dir, exist_ok=True)
+        data = frames() if callable(frames) else frames
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            write_export(data, tmp, export_format(file_name)[1], chunk_rows)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    evict(export_dir, max_bytes, keep=os.path.basename(path), pattern="*")
+    return path
@@ -2,9 +2,21 @@ import re
 import numpy as np
 import pandas as pd
 from .cleaners import (
-    clean_year, parse_age, clean_gender, clean_patienttype, clean_specimen,
+    parse_age_series, clean_gender, clean_patienttype, clean_specimen,
     clean_pathogen, clean_antibiotic, clean_sir
 )
+from .engine import run_cleaners
+from .dates import parse_dates, parse_years
+from .categories import encode_categories
+from .age import add_age_columns
+from profiling import profiled
+
+# cleaned + key columns, in display order
+CLEAN_COLUMNS = [
+    'year_clean','patient_id_key','age_value','age_type','age_years','age_band','age_band_5y','gender_clean',
+    'patienttype_clean','sample_date_clean','specimen_clean','pathogen_clean',
+    'antibiotic_clean','sir_clean','facility_clean','hcf_id_clean'
+]
 
 def normalize_cols(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
@@ -18,34 +30,75 @@ def pick_col(df: pd.DataFrame, candidates):
             return c
     return None
 
-def _first_nonnull(s: pd.Series):
-    nonnull = s.dropna()
-    return nonnull.iloc[0] if not nonnull.empty else np.nan
+COMPLETE_CAT_COLS = [
+    'gender_clean','patienttype_clean','specimen_clean','pathogen_clean',
+    'facility_clean','hcf_id_clean','sir_clean','age_type'
+]
+COMPLETE_NUM_COLS = ['age_value','year_clean']
+UNKNOWN_FILL_COLS = [
+    'gender_clean','patienttype_clean','sir_clean','facility_clean','hcf_id_clean',
+    'age_type','specimen_clean','pathogen_clean'
+]
 
-def complete_patient_fields(df: pd.DataFrame) -> pd.DataFrame:
-    if 'patient_id_key' not in df.columns:
-        return df
+# What a missing PATIENT_ID becomes in patient_id_key (str of NaN / None / pd.NA, or blank)
+MISSING_PATIENT_IDS = ['', 'nan', 'None', '<NA>']
+
+def patient_id_missing(s: pd.Series) -> np.ndarray:
+    """True where a patient_id_key is missing (NaN or a stringified missing value)."""
+    return (s.isna() | s.isin(MISSING_PATIENT_IDS)).to_numpy()
+
+def id_strings(s: pd.Series) -> pd.Series:
+    """
+    ID column as stripped text. A numeric ID column with blanks is read as float
+    (123 -> 123.0); whole numbers are written back without the '.0', so keys match
+    the streamed path, which reads every column as text.
+    """
+    if pd.api.types.is_float_dtype(s):
+        whole = s.notna() & (s % 1 == 0)
+        out = s.astype(object)
+        out[whole] = s[whole].astype('int64').astype(str)
+        s = out
+    return s.astype(str).str.strip()
+
+def patient_firsts(df: pd.DataFrame) -> pd.DataFrame:
+    """First non-null value (in row order) of each completion column, one row per patient_id_key."""
+    cols = [c for c in COMPLETE_CAT_COLS + COMPLETE_NUM_COLS if c in df.columns]
+    return df.groupby('patient_id_key', dropna=False, sort=False)[cols].first()
+
+def fill_patient_fields(df: pd.DataFrame, firsts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Fill missing completion columns from a patient_firsts table (looked up by
+    patient_id_key), then set still-missing categorical fields to 'Unknown'.
+    `firsts` may come from a larger dataset than `df` (chunked / appended data).
+    """
     df = df.copy()
-    grp = df.groupby('patient_id_key', dropna=False)
-    cat_cols = [c for c in [
-        'gender_clean','patienttype_clean','specimen_clean','pathogen_clean',
-        'facility_clean','hcf_id_clean','sir_clean','age_type'
-    ] if c in df.columns]
-    num_cols = [c for c in ['age_value','year_clean'] if c in df.columns]
-    for c in cat_cols:
-        firsts = grp[c].transform(_first_nonnull)
-        df[c] = df[c].fillna(firsts)
-        df[c] = grp[c].transform(lambda s: s.ffill().bfill())
-    for c in num_cols:
-        firsts = grp[c].transform(_first_nonnull)
-        df[c] = df[c].fillna(firsts)
-        df[c] = grp[c].transform(lambda s: s.ffill().bfill())
-    for c in ['gender_clean','patienttype_clean','sir_clean','facility_clean','hcf_id_clean','age_type','specimen_clean','pathogen_clean']:
+    cols = [c for c in firsts.columns if c in df.columns]
+    if cols:
+        looked_up = firsts[cols].reindex(df['patient_id_key'].to_numpy())
+        for c in cols:
+            df[c] = df[c].where(df[c].notna(), looked_up[c].to_numpy())
+    for c in UNKNOWN_FILL_COLS:
         if c in df.columns:
             df[c] = df[c].fillna('Unknown')
     return df
 
-def clean_data(df_raw: pd.DataFrame) -> pd.DataFrame:
+@profiled()
+def complete_patient_fields(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Fill gaps in patient-level fields from the patient's other rows: every missing
+    value takes the patient's first non-null value (in row order), then the
+    categorical fields that are still missing become 'Unknown'.
+
+    One native groupby 'first' over all target columns (groupby 'first' skips
+    nulls), instead of per-column Python transforms.
+    """
+    if 'patient_id_key' not in df.columns:
+        return df
+    return fill_patient_fields(df, patient_firsts(df))
+
+@profiled()
+def clean_rows(df_raw: pd.DataFrame) -> pd.DataFrame:
+    """Row-local part of clean_data: normalize columns and add the *_clean columns (no patient completion)."""
     df = normalize_cols(df_raw)
     col_year       = pick_col(df, ['year'])
     col_age        = pick_col(df, ['age','age_value'])
@@ -60,21 +113,59 @@ def clean_data(df_raw: pd.DataFrame) -> pd.DataFrame:
     col_facility   = pick_col(df, ['facility','hospital','site','location','clinic','ward'])
     col_hcf_id     = pick_col(df, ['hcf_id','hcfid','facility_id','site_id','hospital_id'])
 
-    if col_year: df['year_clean'] = df[col_year].apply(clean_year).astype('Int64')
-    if col_age:
-        ages = df[col_age].apply(parse_age)
-        df['age_value'], df['age_type'] = zip(*ages)
-    if col_gender: df['gender_clean'] = df[col_gender].apply(clean_gender)
-    if col_ptype:  df['patienttype_clean'] = df[col_ptype].apply(clean_patienttype)
-    if col_spec:   df['specimen_clean'] = df[col_spec].apply(clean_specimen)
-    if col_path:   df['pathogen_clean'] = df[col_path].apply(clean_pathogen)
-    if col_abx:    df['antibiotic_clean'] = df[col_abx].apply(clean_antibiotic)
-    if col_sir:    df['sir_clean'] = df[col_sir].apply(clean_sir)
+    steps = [step for step in [
+        (col_year,   'year_clean',              parse_years,      True),
+        (col_age,    ('age_value', 'age_type'), parse_age_series, True),
+        (col_gender, 'gender_clean',            clean_gender,     False),
+        (col_ptype,  'patienttype_clean',       clean_patienttype, False),
+        (col_spec,   'specimen_clean',          clean_specimen,   False),
+        (col_path,   'pathogen_clean',          clean_pathogen,   False),
+        (col_abx,    'antibiotic_clean',        clean_antibiotic, False),
+        (col_sir,    'sir_clean',               clean_sir,        False),
+        (col_sampledate, 'sample_date_clean',   parse_dates,      True),
+    ] if step[0]]
+    report = run_cleaners(df, steps)
     if col_sampledate:
-        df['sample_date_clean'] = pd.to_datetime(df[col_sampledate], errors='coerce', dayfirst=True)
-    if col_pid: df['patient_id_key'] = df[col_pid].astype(str).str.strip()
+        # derive the year from the sample date wherever the year column gives none
+        sample_years = df['sample_date_clean'].dt.year.astype('Int64')
+        df['year_clean'] = df['year_clean'].fillna(sample_years) if col_year else sample_years
+    if col_pid: df['patient_id_key'] = id_strings(df[col_pid])
     if col_facility: df['facility_clean'] = df[col_facility].astype(str).str.strip().replace({'': np.nan})
-    if col_hcf_id:  df['hcf_id_clean'] = df[col_hcf_id].astype(str).str.strip().replace({'': np.nan})
+    if col_hcf_id:  df['hcf_id_clean'] = id_strings(df[col_hcf_id]).replace({'': np.nan})
+
+    # plain records (not a DataFrame) so attrs stay comparable across concat/merge
+    df.attrs['clean_report'] = report.to_dict('records')
+    return df
+
+def add_patient_codes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Dense int32 'patient_code' per patient_id_key (0..n_patients-1 in order of
+    first appearance, -1 if missing), in place. Distinct-patient counts work on
+    these codes instead of hashing the string IDs (see analytics/cube.py).
+    """
+    if 'patient_id_key' in df.columns:
+        df['patient_code'] = pd.factorize(df['patient_id_key'])[0].astype('int32')
+    return df
+
+@profiled()
+def compact_frame(df: pd.DataFrame, keep_raw: bool = True, categories: dict = None,
+                  patient_codes: bool = True) -> pd.DataFrame:
+    """
+    Compact cleaned frame: the *_clean string columns dictionary-encoded as
+    categoricals over stable vocabularies (see data/categories.py), the age in
+    years and age bands (data/age.py, from the completed age fields), plus
+    patient_code (unless patient_codes=False, e.g. for one chunk of a larger dataset).
+    keep_raw=False also drops the raw source columns (only CLEAN_COLUMNS are kept).
+    """
+    if not keep_raw:
+        df = df[[c for c in CLEAN_COLUMNS if c in df.columns]]
+    df = add_age_columns(encode_categories(df, categories))
+    return add_patient_codes(df) if patient_codes else df
 
-    df = complete_patient_fields(df)
+@profiled()
+def clean_data(df_raw: pd.DataFrame, keep_raw: bool = True) -> pd.DataFrame:
+    df = clean_rows(df_raw)
+    report = df.attrs.get('clean_report')
+    df = compact_frame(complete_patient_fields(df), keep_raw=keep_raw)
+    df.attrs['clean_report'] = report
     return df
@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Process-wide registry of cleaned datasets, shared by every session: a dataset
+# (identified by its content key, e.g. data.cache.cache_key of the uploaded
+# bytes) is built once, under a per-key lock so concurrent requests wait for
+# that one build, and every session then gets the same read-only frame.
+# Memory and CPU grow with distinct datasets, not with users.
+
+_datasets = OrderedDict()      # key -> (frame, bytes), least recently used first
+_guard = threading.Lock()
+_build_locks = {}
+_stats = {"builds": 0, "hits": 0, "waits": 0}
+
+
+def _buffers(values) -> list:
+    """
+    numpy buffers behind one block of a frame (ndarray or pandas extension array).
+    Object arrays are left out: pandas' Cython routines (memory_usage, hashing)
+    reject read-only object buffers.
+    """
+    if isinstance(values, np.ndarray):
+        arrays = [values]
+    else:
+        arrays = [getattr(values, n, None) for n in ("_ndarray", "_data", "_mask", "_codes")]
+    return [a for a in arrays if isinstance(a, np.ndarray) and a.dtype != object]
+
+
+def freeze(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Mark the frame's data read-only (in place; object columns excepted), so a
+    session writing into the shared frame fails loudly instead of changing it
+    for everyone. Derived
+    frames (take, copy, filters) are writable as usual.
+    """
+    for values in df._mgr.arrays:
+        for buf in _buffers(values):
+            buf.flags.writeable = False
+    return df
+
+
+def _evict(max_bytes: int, keep: str) -> None:
+    total = sum(size for _, size in _datasets.values())
+    for key in list(_datasets):
+        if total <= max_bytes:
+            break
+        if key != keep:
+            total -= _datasets.pop(key)[1]
+
+
+def get_dataset(key: str, build, max_bytes: int = None) -> pd.DataFrame:
+    """
+    The shared frame for `key`, built by `build()` on first request. Concurrent
+    callers for the same key wait for the running build instead of starting
+    their own; a failed build is retried by the next caller. Least recently used
+    datasets are dropped while the registry is above max_bytes (sessions still
+    holding one keep it alive until they let go).
+    """
+    with _guard:
+        if key in _datasets:
+            _datasets.move_to_end(key)
+            _stats["hits"] += 1
+            return _datasets[key][0]
+        lock = _build_locks.setdefault(key, threading.Lock())
+    if lock.locked():
+        _stats["waits"] += 1
+    with lock:
+        with _guard:
+            if key in _datasets:          # built while we waited
+                _datasets.move_to_end(key)
+                _stats["hits"] += 1
+                return _datasets[key][0]
+        df = build()
+        size = int(df.memory_usage(deep=True).sum())
+        df = freeze(df)
+        df.attrs['dataset_key'] = key
+        with _guard:
+            _datasets[key] = (df, size)
+            _stats["builds"] += 1
+            if max_bytes is not None:
+                _evict(max_bytes, keep=key)
+            _build_locks.pop(key, None)
+    return df
+
+
+def drop_dataset(key: str) -> None:
+    with _guard:
+        _datasets.pop(key, None)
+
+
+def registry_stats() -> dict:
+    """Datasets held, their size in MB, and build / hit / wait counts since start."""
+    with _guard:
+        return {"datasets": len(_datasets),
+                "mb": round(sum(size for _, size in _datasets.values()) / 1024**2, 1), **_stats}
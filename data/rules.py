@@ -0,0 +1,83 @@
+import re
+
+
+def _trie_pattern(words) -> str:
+    """
+    Build one regex alternation from `words`, factored by common prefixes
+    (a trie), so matching cost depends on word length, not on word count.
+    At each position the longest word is preferred.
+    """
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != ""]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return "(?:" + body + ")?" if "" in node else body
+
+    return build(trie)
+
+
+class RuleMatcher:
+    """
+    Priority-ordered rule table compiled once into a single multi-pattern matcher.
+
+    rules : list of (result, alternatives)
+        `alternatives` is a list of literal sets; a rule fires when every literal
+        of at least one set is present in the value. The first firing rule wins,
+        exactly like an if-chain written in the same order.
+    mode : "substring" | "token"
+        - "substring": literals may occur anywhere. All literals are found in one
+          scan with a trie-compiled regex (plus a precomputed "contains" closure,
+          since only the longest literal is reported at each position).
+        - "token": literals must equal whole whitespace-separated tokens.
+
+    Only rules that reference a literal actually found are checked, so the cost
+    per value stays flat as the table grows.
+    """
+
+    def __init__(self, rules, mode: str = "substring"):
+        if mode not in ("substring", "token"):
+            raise ValueError("mode must be 'substring' or 'token'")
+        self.mode = mode
+        self.results = [result for result, _ in rules]
+        self.alternatives = [[frozenset(alt) for alt in alts] for _, alts in rules]
+
+        self.literals = frozenset(lit for alts in self.alternatives for alt in alts for lit in alt)
+        self._rules_by_literal = {lit: [] for lit in self.literals}
+        for i, alts in enumerate(self.alternatives):
+            for lit in set().union(*alts):
+                self._rules_by_literal[lit].append(i)
+
+        if mode == "substring" and self.literals:
+            ordered = sorted(self.literals)
+            self._scan = re.compile("(?=(" + _trie_pattern(ordered) + "))")
+            self._implied = {lit: frozenset(o for o in ordered if o in lit) for lit in ordered}
+
+    def found(self, value: str) -> set:
+        """Set of rule literals present in `value`."""
+        if self.mode == "token":
+            return self.literals.intersection(value.split())
+        if not self.literals:
+            return set()
+        found = set()
+        for hit in self._scan.findall(value):
+            found |= self._implied[hit]
+        return found
+
+    def match(self, value: str, default=None):
+        """Result of the highest-priority rule that fires for `value`, else `default`."""
+        found = self.found(value)
+        if not found:
+            return default
+        candidates = sorted({i for lit in found for i in self._rules_by_literal[lit]})
+        for i in candidates:
+            if any(alt <= found for alt in self.alternatives[i]):
+                return self.results[i]
+        return default
@@ -0,0 +1,340 @@
+import os
+import glob
+import json
+import hashlib
+import pandas as pd
+from pandas.api.types import is_object_dtype
+from analytics.cube import CUBE_KEYS
+from .pipeline import clean_rows, patient_firsts, fill_patient_fields, compact_frame, add_patient_codes
+from .categories import OPEN_VOCABULARIES, vocabulary
+
+# On-disk columnar store (Parquet, needs pyarrow):
+#   <store>/parts/part-00000.parquet ...   row-cleaned chunks, before patient completion
+#   <store>/patients/patients-00000.parquet ...
+#                                          first non-null completion values per patient_id_key,
+#                                          one file per part that added patients (earlier win)
+#   <store>/cube/slice-<id>.parquet ...    completed row counts per CUBE_KEYS cell and patient,
+#                                          one file per (year_clean, facility_clean) slice
+#   <store>/meta.json                      row/part counts, ingested batches, open category
+#                                          values and cleaning report
+PARTS_DIR = "parts"
+PATIENTS_DIR = "patients"
+PATIENTS_FILE = "patients.parquet"      # single patients table of stores written before PATIENTS_DIR
+CUBE_DIR = "cube"
+META_FILE = "meta.json"
+
+# The cube is kept per (year, facility) slice: an append rewrites only the slices
+# its rows (and the older rows of patients it completes) fall into
+SLICE_KEYS = ['year_clean', 'facility_clean']
+CELL_KEYS = CUBE_KEYS + ['patient_id_key']
+
+
+def arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """Object columns -> pandas string dtype, so every part gets the same Parquet schema (attrs dropped)."""
+    df = df.copy()
+    df.attrs = {}
+    for c in df.columns:
+        if is_object_dtype(df[c]):
+            df[c] = df[c].astype("string")
+    return df
+
+
+def read_raw(src, nrows: int = None) -> pd.DataFrame:
+    """Raw CSV/Excel as uploaded: `src` is a path or a named file object (CSV falls back to latin-1)."""
+    name = src if isinstance(src, str) else src.name
+    if hasattr(src, "seek"):
+        src.seek(0)
+    if name.lower().endswith((".xlsx", ".xls")):
+        return pd.read_excel(src, nrows=nrows)
+    try:
+        return pd.read_csv(src, nrows=nrows)
+    except Exception:
+        if hasattr(src, "seek"):
+            src.seek(0)
+        return pd.read_csv(src, encoding="latin1", nrows=nrows)
+
+
+def _part_paths(store_dir: str) -> list:
+    return sorted(glob.glob(os.path.join(store_dir, PARTS_DIR, "part-*.parquet")))
+
+
+def _merge_firsts(acc: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Keep earlier non-null values, take new ones only where nothing was seen yet."""
+    if acc is None:
+        return new
+    return acc.combine_first(new)
+
+
+def _write_part(df: pd.DataFrame, store_dir: str, n: int) -> str:
+    path = os.path.join(store_dir, PARTS_DIR, f"part-{n:05d}.parquet")
+    arrow_safe(df).to_parquet(path, index=False)
+    return path
+
+
+def _patient_paths(store_dir: str) -> list:
+    legacy = os.path.join(store_dir, PATIENTS_FILE)
+    return ([legacy] if os.path.exists(legacy) else []) + \
+        sorted(glob.glob(os.path.join(store_dir, PATIENTS_DIR, "patients-*.parquet")))
+
+
+def read_patients(store_dir: str, keys=None) -> pd.DataFrame:
+    """
+    Patients table of the store (None if it has none): the per-part tables
+    merged, earlier non-null values winning. `keys`: only these patient_id_keys.
+    """
+    paths = _patient_paths(store_dir)
+    if not paths:
+        return None
+    filters = None if keys is None else [("patient_id_key", "in", list(keys))]
+    frames = [pd.read_parquet(p, filters=filters) for p in paths] if keys is None or len(keys) else []
+    if not frames:
+        return None
+    if len(frames) == 1:
+        return frames[0].set_index("patient_id_key")
+    # first() skips nulls: per column the first value in file order, as _merge_firsts
+    return pd.concat(frames, ignore_index=True).groupby("patient_id_key", sort=False).first()
+
+
+def write_patients(firsts: pd.DataFrame, store_dir: str, n: int) -> None:
+    """Patients first seen (or completed further) by part `n`; merged on read by read_patients."""
+    if firsts is None or firsts.empty:
+        return
+    os.makedirs(os.path.join(store_dir, PATIENTS_DIR), exist_ok=True)
+    arrow_safe(firsts.rename_axis("patient_id_key").reset_index()).to_parquet(
+        os.path.join(store_dir, PATIENTS_DIR, f"patients-{n:05d}.parquet"), index=False)
+
+
+def read_meta(store_dir: str) -> dict:
+    path = os.path.join(store_dir, META_FILE)
+    if not os.path.exists(path):
+        return {"rows": 0, "parts": 0, "batches": [], "report": []}
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def write_meta(meta: dict, store_dir: str) -> None:
+    with open(os.path.join(store_dir, META_FILE), "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, indent=2, default=str)
+
+
+def _add_categories(meta: dict, df: pd.DataFrame) -> None:
+    """Merge the open-vocabulary values of a row-cleaned frame into meta["categories"]."""
+    cats = meta.setdefault("categories", {})
+    for c in OPEN_VOCABULARIES:
+        if c in df.columns:
+            cats[c] = sorted(set(cats.get(c, [])).union(v for v in df[c].unique() if pd.notna(v)))
+
+
+def ingest_csv(src, store_dir: str, chunksize: int = 250_000, encoding: str = None) -> dict:
+    """
+    Stream a CSV (path or file object) into a columnar store, chunk by chunk.
+
+    Pass 1 reads `chunksize` rows at a time (all columns as text, so every chunk
+    has the same schema), runs the row cleaners and writes each chunk as a Parquet
+    part, while keeping only the per-patient first non-null values in memory.
+    Pass 2 (patient completion across chunks) runs when the store is read, see
+    iter_store/load_store. Peak memory is bounded by the chunk size plus the
+    per-patient table, not by the file size.
+
+    Returns the store metadata (rows, parts, per-chunk cleaning report).
+    """
+    os.makedirs(os.path.join(store_dir, PARTS_DIR), exist_ok=True)
+    meta = read_meta(store_dir)
+    if meta["parts"] and "categories" not in meta:
+        meta["categories"] = _scan_categories(store_dir)
+    first_part, firsts = meta["parts"], None
+    reader = pd.read_csv(src, chunksize=chunksize, dtype=str, encoding=encoding)
+    for chunk in reader:
+        cleaned = clean_rows(chunk)
+        _write_part(cleaned, store_dir, meta["parts"])
+        _add_categories(meta, cleaned)
+        if "patient_id_key" in cleaned.columns:
+            firsts = _merge_firsts(firsts, patient_firsts(cleaned))
+        meta["report"] += [dict(r, part=meta["parts"]) for r in cleaned.attrs.get("clean_report", [])]
+        meta["rows"] += len(cleaned)
+        meta["parts"] += 1
+    write_patients(firsts, store_dir, first_part)
+    meta["cube"] = False             # stale now: rebuilt in one pass by the next append_batch
+    write_meta(meta, store_dir)
+    return meta
+
+
+def iter_store(store_dir: str, columns: list = None):
+    """Yield the store one part at a time, with patient completion applied (pass 2)."""
+    firsts = read_patients(store_dir)
+    for path in _part_paths(store_dir):
+        part = pd.read_parquet(path)
+        if firsts is not None and "patient_id_key" in part.columns:
+            part = fill_patient_fields(part, firsts)
+        if columns is not None:
+            part = part[[c for c in columns if c in part.columns]]
+        yield part
+
+
+def _scan_categories(store_dir: str) -> dict:
+    """meta["categories"] rebuilt from the parts (open columns only), for stores written without it."""
+    import pyarrow.parquet as pq
+    meta = {}
+    for path in _part_paths(store_dir):
+        names = pq.read_schema(path).names
+        _add_categories(meta, pd.read_parquet(path, columns=[c for c in OPEN_VOCABULARIES if c in names]))
+    return meta.get("categories", {})
+
+
+def store_categories(store_dir: str) -> dict:
+    """
+    Open category vocabularies of the whole store, from meta.json. Patient
+    completion only copies values between a patient's rows (or adds 'Unknown'),
+    so the row-cleaned values kept there cover the completed store.
+    """
+    meta = read_meta(store_dir)
+    cats = meta["categories"] if "categories" in meta else _scan_categories(store_dir)
+    return {c: vocabulary(c, values) for c, values in cats.items()}
+
+
+def load_store(store_dir: str, columns: list = None) -> pd.DataFrame:
+    """
+    Whole store as one completed, compact frame (optionally only `columns`).
+    Parts are dictionary-encoded one at a time with the store-wide vocabularies,
+    so the object-string columns of all parts are never held together.
+    """
+    cats = store_categories(store_dir)
+    parts = [compact_frame(p, categories=cats, patient_codes=False) for p in iter_store(store_dir, columns)]
+    if not parts:
+        return pd.DataFrame(columns=columns or [])
+    return add_patient_codes(pd.concat(parts, ignore_index=True))
+
+
+def _cell_counts(df: pd.DataFrame) -> pd.DataFrame:
+    """Completed rows of `df` counted per CELL_KEYS combination (absent or missing keys as <NA>)."""
+    keys = arrow_safe(df.reindex(columns=CELL_KEYS))
+    return keys.groupby(CELL_KEYS, dropna=False, observed=True).size().rename("n").reset_index()
+
+
+def _slice_path(store_dir: str, year, facility) -> str:
+    plain = [None if pd.isna(year) else int(year), None if pd.isna(facility) else str(facility)]
+    digest = hashlib.blake2b(json.dumps(plain).encode(), digest_size=8).hexdigest()
+    return os.path.join(store_dir, CUBE_DIR, f"slice-{digest}.parquet")
+
+
+def _update_cube(store_dir: str, deltas: list) -> list:
+    """
+    Add count deltas (negative n retracts rows) to the stored slices they fall
+    into; only those slice files are read and rewritten. Returns the slices.
+    """
+    deltas = [d for d in deltas if d is not None and not d.empty]
+    if not deltas:
+        return []
+    os.makedirs(os.path.join(store_dir, CUBE_DIR), exist_ok=True)
+    slices = []
+    for (year, facility), delta in pd.concat(deltas, ignore_index=True).groupby(SLICE_KEYS, dropna=False, sort=False):
+        path = _slice_path(store_dir, year, facility)
+        merged = pd.concat([pd.read_parquet(path), delta], ignore_index=True) if os.path.exists(path) else delta
+        total = arrow_safe(merged).groupby(CELL_KEYS, dropna=False, observed=True)["n"].sum()
+        total = total[total != 0].reset_index()
+        if total.empty:
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            total.to_parquet(path, index=False)
+        slices.append((None if pd.isna(year) else int(year), None if pd.isna(facility) else str(facility)))
+    return slices
+
+
+def _build_cube(store_dir: str, meta: dict) -> None:
+    """Whole cube from the completed parts, for stores that don't keep one yet (one pass)."""
+    for path in glob.glob(os.path.join(store_dir, CUBE_DIR, "slice-*.parquet")):
+        os.remove(path)
+    counts = [_cell_counts(part) for part in iter_store(store_dir)]
+    _update_cube(store_dir, [pd.concat(counts, ignore_index=True)] if counts else [])
+    meta["cube_keys"] = sorted(set(meta.get("cube_keys", [])).union(
+        c for path in _part_paths(store_dir) for c in _columns(path) if c in CUBE_KEYS))
+    meta["cube"] = True
+
+
+def _columns(path: str) -> list:
+    import pyarrow.parquet as pq
+    return pq.read_schema(path).names
+
+
+def read_cube(store_dir: str) -> pd.DataFrame:
+    """
+    The store's cell counts (CUBE_KEYS columns the data has, patient_id_key, n),
+    completed and encoded like load_store; None if the store keeps no cube.
+    """
+    meta = read_meta(store_dir)
+    paths = glob.glob(os.path.join(store_dir, CUBE_DIR, "slice-*.parquet"))
+    if not meta.get("cube") or not paths:
+        return None
+    cols = [c for c in CUBE_KEYS if c in meta.get("cube_keys", [])] + ["patient_id_key", "n"]
+    counts = pd.concat([pd.read_parquet(p, columns=cols) for p in paths], ignore_index=True)
+    counts = compact_frame(counts, categories=store_categories(store_dir), patient_codes=False)
+    return counts.astype({"year_clean": "Int64"}) if "year_clean" in counts.columns else counts
+
+
+def append_batch(store_dir: str, df_raw: pd.DataFrame, batch_id: str = None) -> dict:
+    """
+    Add one new submission (e.g. a facility's monthly file) to a store incrementally,
+    in time proportional to the submission, not to the store.
+
+    - Only the new batch is cleaned; it is written as a new part.
+    - Patient completion is re-run only for the patient_id_keys in the batch:
+      their first non-null values are written as a new patients file (earlier
+      values win on read, as in clean_data).
+    - The stored cube is updated by deltas for the (year, facility) slices that
+      changed: the batch rows, plus older rows of batch patients whose completed
+      values change because the batch supplies a field they were missing.
+
+    `batch_id` (e.g. the file's content hash) makes re-appending the same file a no-op.
+    Returns {"rows", "skipped", "patients", "slices"} for this batch.
+    """
+    os.makedirs(os.path.join(store_dir, PARTS_DIR), exist_ok=True)
+    meta = read_meta(store_dir)
+    meta.setdefault("batches", [])
+    if batch_id is not None and batch_id in meta["batches"]:
+        return {"rows": 0, "skipped": True, "patients": 0, "slices": []}
+
+    if meta["parts"] and "categories" not in meta:
+        meta["categories"] = _scan_categories(store_dir)
+    if not meta.get("cube"):
+        _build_cube(store_dir, meta)
+    old_parts = _part_paths(store_dir)
+    cleaned = clean_rows(df_raw)
+    deltas = []
+
+    if "patient_id_key" in cleaned.columns:
+        batch_firsts = patient_firsts(cleaned)
+        touched = batch_firsts.index
+        old_firsts = read_patients(store_dir, keys=touched)
+        firsts = batch_firsts if old_firsts is None else _merge_firsts(old_firsts.reindex(touched), batch_firsts)
+        if old_firsts is not None:
+            # existing patients whose completed values change: a field they had no value for
+            known = touched[touched.isin(old_firsts.index)]
+            prev = old_firsts.reindex(known)
+            gained = (prev.isna() & firsts.loc[known, prev.columns].notna()).any(axis=1)
+            changed = known[gained.to_numpy()]
+            if len(changed) and old_parts:
+                keys = list(changed)
+                rows = [pd.read_parquet(p, filters=[("patient_id_key", "in", keys)]) for p in old_parts]
+                rows = pd.concat([r for r in rows if not r.empty] or [pd.DataFrame()], ignore_index=True)
+                if not rows.empty:
+                    before = _cell_counts(fill_patient_fields(rows, old_firsts))
+                    deltas += [before.assign(n=-before["n"]), _cell_counts(fill_patient_fields(rows, firsts))]
+        write_patients(batch_firsts, store_dir, meta["parts"])
+        deltas.append(_cell_counts(fill_patient_fields(cleaned, firsts)))
+    else:
+        deltas.append(_cell_counts(cleaned))      # iter_store leaves such parts as cleaned
+
+    _write_part(cleaned, store_dir, meta["parts"])
+    slices = _update_cube(store_dir, deltas)
+    meta["cube_keys"] = sorted(set(meta.get("cube_keys", [])).union(c for c in cleaned.columns if c in CUBE_KEYS))
+    _add_categories(meta, cleaned)
+    meta["report"] += [dict(r, part=meta["parts"]) for r in cleaned.attrs.get("clean_report", [])]
+    meta["rows"] += len(cleaned)
+    meta["parts"] += 1
+    if batch_id is not None:
+        meta["batches"].append(batch_id)
+    write_meta(meta, store_dir)
+    return {"rows": len(cleaned), "skipped": False,
+            "patients": int(cleaned["patient_id_key"].nunique()) if "patient_id_key" in cleaned.columns else 0,
+            "slices": sorted(slices, key=str)}
@@ -0,0 +1,226 @@
+import numpy as np
+import pandas as pd
+
+# Spellings seen in lab submissions, per canonical value (what the cleaners map them to)
+GENDER_SPELLINGS = {
+    'Male':   ['M', 'M', 'm', 'Male', 'MALE', 'male', 'mALE'],
+    'Female': ['F', 'F', 'f', 'Female', 'FEMALE', 'female', 'fem'],
+}
+MISSING_GENDER = ['.', '', None, None, 'U']
+
+PATIENTTYPE_SPELLINGS = {
+    'Outpatient': ['OUTPATIENT', 'OUTPATIENT', 'Outpatient', 'OPD', 'out', 'outpt'],
+    'Inpatient':  ['INPATIENT', 'INPATENT', 'Inpatient', 'IPD', 'in-pt', 'inpatients'],
+}
+
+# (canonical, weight, spellings)
+SPECIMENS = [
+    ('Urine',        0.30, ['urine', 'URINE', 'Urine', 'urine mcs']),
+    ('Blood',        0.20, ['BLOOD', 'blood', 'Blood-culture', 'blood culture']),
+    ('Pus',          0.12, ['Pus swab', 'pus', 'purulent', 'PUS']),
+    ('Sputum',       0.10, ['sputum', 'SPUTUM']),
+    ('Throat swab',  0.06, ['throat swab', 'Throat Swab', 'THROAT SWAB']),
+    ('Genital swab', 0.06, ['urogenital swab', 'genital swab', 'HVS genital']),
+    ('Lower respiratory (unspecified)', 0.04, ['LOWRESP-', 'lowresp']),
+    ('Tracheal aspirate', 0.03, ['tracheal aspirate', 'TRACHEAL']),
+    ('Catheter tip', 0.03, ['Catheter tip', 'catheter_tip']),
+    ('Ascitic fluid', 0.02, ['ascitic fluid', 'Ascitic']),
+    ('Shunt tip',    0.02, ['shunt_tip', 'Shunt tip']),
+    ('Other',        0.02, ['CSF', 'hydrocele', 'hvs', None]),
+]
+
+PATHOGENS = [
+    ('Escherichia coli',           0.26, ['ESCCOL', 'Escherichia coli', 'E. coli', 'esc col', 'Eschericia coli']),
+    ('Klebsiella pneumoniae',      0.18, ['KLEPNE', 'Klebsiella pneumoniae', 'Klebsiella pnuemoniae', 'klebsiella pneumoniae']),
+    ('Staphylococcus aureus',      0.14, ['STAAUR', 'Staphylococcus aureus', 'staphylococcus aureus']),
+    ('Pseudomonas aeruginosa',     0.08, ['PSEAER', 'pseudomonas aeruginosa', 'Pseudomonas Aeruginosa']),
+    ('Staphylococcus epidermidis', 0.05, ['STAEPI', 'Staphylococcus epidermidis', 'staphylococcus epi']),
+    ('Enterobacter cloacae',       0.04, ['ENTCLO', 'Enterobacter cloacae']),
+    ('Enterobacter spp',           0.03, ['enterobacter sp', 'Enterobacter species']),
+    ('Klebsiella oxytoca',         0.03, ['KLEPOXY', 'klebsiella oxytoca']),
+    ('Streptococcus pneumoniae',   0.03, ['Streptococcus pneumoniae', 'streptococcus pneumoniae']),
+    ('Citrobacter freundii',       0.03, ['Citrobacter freundii', 'citrobacter freundii']),
+    ('Salmonella Typhi',           0.02, ['Salmonella typhi', 'SALMONELLA TYPHI']),
+    ('Neisseria gonorrhoeae',      0.02, ['Neisseria gonorrhoeae', 'neisseria gonorrhoea']),
+    ('Non-lactose fermenters (unspecified)', 0.04, ['NLF', 'nlfc']),
+    ('Lactose fermenters (unspecified)',     0.03, ['lfc', 'LFC']),
+    ('Other',                      0.02, ['staphylococcus saprophyticus', 'STENMAL', None]),
+]
+
+ANTIBIOTICS = [
+    ('Ciprofloxacin',   0.12, ['CIP', 'cipro 5', 'Ciprofloxacin', 'ciprofloxacin']),
+    ('Ceftriaxone',     0.11, ['ceftriaxone', 'CRO', 'Ceftriazone', 'cerftriazone', 'CTR']),
+    ('Gentamicin',      0.10, ['gentamicin', 'GEN', 'Gentamycin 10', 'gm']),
+    ('Co-trimoxazole',  0.09, ['SXT', 'Co-trimoxazole', 'cotrim', 'co trimoxazole', 'sxt 25']),
+    ('Amoxicillin-clavulanate', 0.08, ['AMC', 'AUG', 'Amoxicillin clavulanic acid', 'augumentin']),
+    ('Meropenem',       0.06, ['MEM', 'meropenem', 'MEROPENOM', 'meropen']),
+    ('Amikacin',        0.05, ['AMK', 'amikacin', 'AK']),
+    ('Ampicillin',      0.05, ['AMP', 'ampicillin']),
+    ('Nitrofurantoin',  0.05, ['NIT', 'nitrofurantoin']),
+    ('Cefotaxime',      0.04, ['CTX', 'cefotax', 'cefotaxime']),
+    ('Ceftazidime',     0.04, ['CAZ', 'ceftazid', 'ceftazidime']),
+    ('Imipenem',        0.03, ['IPM', 'imipenem/cil', 'imipenem']),
+    ('Erythromycin',    0.03, ['E', 'ERY', 'erythromycin']),
+    ('Clindamycin',     0.03, ['CD', 'clindamycin', 'clinda']),
+    ('Vancomycin',      0.03, ['VA', 'vancomycin 30', 'vanocomycin']),
+    ('Chloramphenicol', 0.03, ['C', 'chloramph', 'chloramphenicol']),
+    ('Cefoxitin',       0.02, ['FOX', 'cefoxitin']),
+    ('Penicillin G',    0.02, ['penicillin g', 'PG']),
+    ('Other',           0.02, ['xyz', 'foo bar', None]),
+]
+
+SIR_SPELLINGS = {
+    'S': ['S', 'S', 's', 'S-Susceptible', 'sensitive'],
+    'I': ['I', 'I/S', 'int', 'i'],
+    'R': ['R', 'R', 'r ', 'resistant', 'R-Resistant'],
+}
+SIR_JUNK = ['na', '', None, '?']
+
+# how dates are typed (strftime patterns; 'excel' = Excel serial day number)
+DATE_FORMATS = [
+    ('%d/%m/%Y', 0.35), ('%Y-%m-%d', 0.30), ('%Y/%m/%d', 0.08), ('%d-%b-%Y', 0.08),
+    ('%Y-%m-%d %H:%M:%S', 0.07), ('excel', 0.07), ('%-d/%-m/%Y', 0.05),
+]
+DATE_JUNK = [None, '', 'garbage', 'N/A']
+
+FACILITY_NAMES = ['Central', 'West', 'East', 'North', 'South', 'Lakeside', 'Hillside', 'Riverside',
+                  'Mission', 'Airport', 'Border', 'Valley']
+FACILITY_KINDS = [('Hospital', 'H'), ('Clinic', 'C'), ('District Hospital', 'DH')]
+
+
+def _age_pool():
+    """Age strings with their share: mostly years, some months/days/compound, some junk."""
+    groups = [
+        (0.70, [t.format(y) for y in range(2, 100) for t in ('{}YRS', '{}yrs', '{} years', '{}y', '{}')]),
+        (0.10, [t.format(m) for m in range(1, 24) for t in ('{}MONTHS', '{} months', '{}mo', '{} mths', '{}m')]),
+        (0.06, [t.format(y, m) for y in range(1, 5) for m in range(1, 12)
+                for t in ('{}yr {} months', '{}y{}m', '{}yrs{}months', '{}y {} mnths')]),
+        (0.04, [t.format(d) for d in range(1, 31) for t in ('{}DYS', '{} days', '{}d', '{} days old')]),
+        (0.04, [t.format(w) for w in range(1, 8) for t in ('{} wks', '{} Weeks', '{}w')]),
+        (0.06, ['na', '', None, 'x', 'NaN', 'monthsm']),
+    ]
+    values = [v for _, vals in groups for v in vals]
+    weights = np.concatenate([np.full(len(vals), share / len(vals)) for share, vals in groups])
+    return np.array(values, dtype=object), weights
+
+
+def _spelled(rng, canon_idx: np.ndarray, spellings: list) -> np.ndarray:
+    """One random spelling per row of the canonical value with index canon_idx."""
+    flat = np.array([s for sp in spellings for s in sp], dtype=object)
+    offsets = np.cumsum([0] + [len(sp) for sp in spellings[:-1]])
+    sizes = np.array([len(sp) for sp in spellings])
+    pick = (rng.random(len(canon_idx)) * sizes[canon_idx]).astype(np.int64)
+    return flat[offsets[canon_idx] + pick]
+
+
+def _weighted(rng, table: list, n: int):
+    weights = np.array([w for _, w, _ in table])
+    idx = rng.choice(len(table), size=n, p=weights / weights.sum())
+    return _spelled(rng, idx, [sp for _, _, sp in table])
+
+
+def _date_pool(start: str, end: str):
+    """(n_days, n_formats) array of date strings, one column per DATE_FORMATS entry."""
+    days = pd.date_range(start, end, freq='D')
+    secs = (np.arange(len(days)) * 7919) % 86400          # a deterministic time of day
+    cols = []
+    for fmt, _ in DATE_FORMATS:
+        if fmt == 'excel':
+            cols.append(((days - pd.Timestamp('1899-12-30')).days).astype(str).to_numpy(dtype=object))
+        elif '%H' in fmt:
+            cols.append((days + pd.to_timedelta(secs, unit='s')).strftime(fmt).to_numpy(dtype=object))
+        elif '%-' in fmt:
+            cols.append(np.array([f"{d.day}/{d.month}/{d.year}" for d in days], dtype=object))
+        else:
+            cols.append(days.strftime(fmt).to_numpy(dtype=object))
+    return days, np.stack(cols, axis=1)
+
+
+def get_synthetic_df(rows: int, patients: int = None, facilities: int = 12, seed: int = 0,
+                     start: str = '2023-01-01', end: str = '2025-12-31') -> pd.DataFrame:
+    """
+    Seeded synthetic lab submission with the demo's columns and messiness, at any
+    size (tested 10k-10M rows): age strings like '1yr 7 months', typo'd and
+    abbreviated antibiotics, WHONET pathogen codes, mixed date formats, missing
+    and inconsistent genders, junk SIR values. About 4 rows per patient by default;
+    a patient keeps one facility, gender, patient type and age, but individual
+    rows may leave them blank (so complete_patient_fields has work to do).
+    Same arguments -> same frame.
+    """
+    rng = np.random.default_rng(seed)
+    n_pat = max(1, patients if patients is not None else rows // 4)
+
+    # facilities and their HCF ids
+    n_fac = max(1, facilities)
+    fac_names = np.array([f"{FACILITY_NAMES[i % len(FACILITY_NAMES)]} {FACILITY_KINDS[i % 3][0]}"
+                          + (f" {i // len(FACILITY_NAMES) + 1}" if i >= len(FACILITY_NAMES) else "")
+                          for i in range(n_fac)], dtype=object)
+    fac_ids = np.array([f"{FACILITY_KINDS[i % 3][1]}-{i + 1:02d}" for i in range(n_fac)], dtype=object)
+
+    # patient-level attributes
+    pat_fac = rng.integers(0, n_fac, n_pat)
+    pat_gender = rng.integers(0, 2, n_pat)
+    pat_ptype = (rng.random(n_pat) < 0.35).astype(np.int64)        # 1 = inpatient
+    ages, age_w = _age_pool()
+    pat_age = rng.choice(len(ages), size=n_pat, p=age_w)
+    pat_ids = pd.Series(np.arange(n_pat)).astype(str).to_numpy(dtype=object)
+    pat_ids = fac_ids[pat_fac] + '-' + pat_ids
+
+    # rows: patients drawn uniformly, plus a skewed share (some patients are sampled many times)
+    pid = rng.integers(0, n_pat, rows)
+    skewed = rng.random(rows) < 0.3
+    pid[skewed] = rng.permutation(n_pat)[np.minimum((rng.pareto(1.5, skewed.sum()) * n_pat / 50)
+                                                    .astype(np.int64), n_pat - 1)]
+
+    gender = _spelled(rng, pat_gender[pid], list(GENDER_SPELLINGS.values()))
+    miss = rng.random(rows) < 0.08
+    gender[miss] = np.array(MISSING_GENDER, dtype=object)[rng.integers(0, len(MISSING_GENDER), miss.sum())]
+
+    ptype = _spelled(rng, pat_ptype[pid], list(PATIENTTYPE_SPELLINGS.values()))
+    ptype[rng.random(rows) < 0.04] = None
+
+    age = ages[pat_age[pid]]
+    age[rng.random(rows) < 0.05] = None
+
+    days, date_pool = _date_pool(start, end)
+    day = rng.integers(0, len(days), rows)
+    fmt_w = np.array([w for _, w in DATE_FORMATS])
+    sample_date = date_pool[day, rng.choice(len(DATE_FORMATS), size=rows, p=fmt_w / fmt_w.sum())]
+    junk = rng.random(rows) < 0.02
+    sample_date[junk] = np.array(DATE_JUNK, dtype=object)[rng.integers(0, len(DATE_JUNK), junk.sum())]
+
+    year_num = days.year.to_numpy()[day]
+    year = year_num.astype(object)
+    as_text = rng.random(rows) < 0.2
+    year[as_text] = year_num[as_text].astype(str).astype(object)
+    year[rng.random(rows) < 0.05] = None
+
+    sir_idx = rng.choice(3, size=rows, p=[0.55, 0.05, 0.40])
+    sir = _spelled(rng, sir_idx, list(SIR_SPELLINGS.values()))
+    junk = rng.random(rows) < 0.03
+    sir[junk] = np.array(SIR_JUNK, dtype=object)[rng.integers(0, len(SIR_JUNK), junk.sum())]
+
+    patient_id = pat_ids[pid]
+    pad = rng.random(rows) < 0.01
+    patient_id[pad] = '  ' + patient_id[pad] + ' '
+    patient_id[rng.random(rows) < 0.005] = None
+
+    facility = fac_names[pat_fac[pid]]
+    hcf = fac_ids[pat_fac[pid]]
+    facility[rng.random(rows) < 0.01] = None
+    hcf[rng.random(rows) < 0.02] = ''
+
+    return pd.DataFrame({
+        'YEAR': year,
+        'PATIENT_ID': patient_id,
+        'AGE': age,
+        'GENDER': gender,
+        'PATIENTTYPE': ptype,
+        'SAMPLE_DATE': sample_date,
+        'SPECIMEN': _weighted(rng, SPECIMENS, rows),
+        'PATHOGEN': _weighted(rng, PATHOGENS, rows),
+        'ANTIBIOTIC': _weighted(rng, ANTIBIOTICS, rows),
+        'SIR': sir,
+        'FACILITY': facility,
+        'HCF_ID': hcf,
+    })
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import functools
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from config import PROFILE, PROFILE_LOG
+
+# Per-stage timers (and optional tracemalloc peaks) for one run of a page or
+# batch job. Off by default; when off, a profiled call costs one attribute
+# lookup on a thread-local before calling straight through.
+
+_state = threading.local()
+_OFF = nullcontext()
+_tracing = False     # tracemalloc was started here
+_MAX_RECORDS = 5000
+
+
+def is_enabled() -> bool:
+    return getattr(_state, "enabled", PROFILE)
+
+
+def start_run(enabled: bool = None, memory: bool = False) -> None:
+    """Begin collecting for this thread's run (a Streamlit rerun); enabled=None uses config.PROFILE."""
+    _state.enabled = PROFILE if enabled is None else enabled
+    _state.memory = bool(memory) and _state.enabled
+    _state.records = []
+    _state.stack = []
+    _state.t0 = time.perf_counter()
+    global _tracing
+    if _state.memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _tracing = True
+    elif not _state.memory and _tracing:
+        # memory counters slow every allocation down: stop tracing we started once nobody asks
+        tracemalloc.stop()
+        _tracing = False
+
+
+def records() -> list:
+    """Stage records of the current run, in start order: stage, depth, seconds, peak_mb, rows."""
+    return list(getattr(_state, "records", []))
+
+
+def run_seconds() -> float:
+    t0 = getattr(_state, "t0", None)
+    return 0.0 if t0 is None else time.perf_counter() - t0
+
+
+def _rows(obj):
+    try:
+        return len(obj) if hasattr(obj, "columns") else None
+    except TypeError:
+        return None
+
+
+@contextmanager
+def _timed(name: str, rows=None):
+    if not hasattr(_state, "records"):
+        start_run(True)
+    rec = {"stage": name, "depth": len(_state.stack), "seconds": None, "peak_mb": None, "rows": rows}
+    if len(_state.records) >= _MAX_RECORDS:      # threads that never call start_run()
+        del _state.records[:_MAX_RECORDS // 2]
+    _state.records.append(rec)
+    memory = _state.memory and tracemalloc.is_tracing()
+    if memory:
+        start_cur, outer_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+    frame = {"child_peak": 0}
+    _state.stack.append(frame)
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    finally:
+        rec["seconds"] = round(time.perf_counter() - t0, 6)
+        _state.stack.pop()
+        if memory:
+            peak = max(tracemalloc.get_traced_memory()[1], frame["child_peak"])
+            rec["peak_mb"] = round(max(peak - start_cur, 0) / 1024**2, 3)
+            # reset_peak() above forgot the enclosing stage's peak: hand it up
+            if _state.stack:
+                _state.stack[-1]["child_peak"] = max(_state.stack[-1]["child_peak"], peak, outer_peak)
+
+
+def stage(name: str, rows=None):
+    """Context manager timing a block as `name` (no-op when profiling is off)."""
+    return _timed(name, rows) if is_enabled() else _OFF
+
+
+def profiled(name: str = None):
+    """Decorator timing every call of a function; rows = len of a DataFrame first argument."""
+    def deco(fn):
+        label = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not getattr(_state, "enabled", PROFILE):
+                return fn(*args, **kwargs)
+            with _timed(label, _rows(args[0]) if args else None):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def append_log(path: str = PROFILE_LOG, **context) -> None:
+    """Append the current run (context fields + total + stage records) as one JSON line."""
+    entry = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **context,
+        "total_seconds": round(run_seconds(), 6),
+        "stages": records(),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write(json.dumps(entry, default=str) + "\n")
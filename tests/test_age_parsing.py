@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+from data.cleaners import parse_age, parse_age_series
+
+# Age strings as they come in the submissions: every unit and its spellings,
+# compound forms, decimals, case and punctuation, blanks and junk
+CORPUS = [
+    # bare numbers (years)
+    "0", "7", "45", "045", " 32 ", "120",
+    # years
+    "5y", "5 y", "5yr", "5 yrs", "5 year", "5 years", "5YEARS", "5-years", "5years.",
+    # months (incl. the 'm' shorthand and the 'monthsm' typo)
+    "3m", "3 m", "3mo", "3 mos", "3mth", "3 mths", "3mnth", "3 mnths", "3 month", "3 months",
+    "11monthsm", "18 months", "24m",
+    # weeks
+    "2w", "2 wk", "2wks", "2 week", "2 weeks",
+    # days
+    "10d", "10 dy", "10 dys", "10 day", "10 days", "400 days",
+    # hours
+    "6h", "6 hr", "6hrs", "6 hour", "36 hours",
+    # compound forms
+    "1y 6m", "1 year 6 months", "2yrs3mths", "1y2mo3w", "3 months 2 weeks", "2w 3d",
+    "1d 12h", "5 days 6 hours", "1 year, 2 months", "1/12", "6m 15d",
+    # decimals (the integer parts are read as separate numbers)
+    "1.5", "1.5 years", "2.5y", "0.5 months",
+    # blanks and nulls
+    None, np.nan, pd.NA, "", "   ", "nan", "NaN", "NA", "none", "Null",
+    # junk
+    "unknown", "adult", "?", "-", "y", "months", "abc123", "12abc", "5 x", "1e3",
+]
+
+# Pinned results for a few entries, so both parsers can't drift together
+EXPECTED = {
+    "45": (45.0, "Years"),
+    "5 years": (5.0, "Years"),
+    "3m": (3.0, "Months"),
+    "11monthsm": (11.0, "Months"),
+    "2 weeks": (2.0, "Weeks"),
+    "10 days": (10.0, "Days"),
+    "36 hours": (36.0, "Hours"),
+    "1y 6m": (1.5, "Years"),
+    "3 months 2 weeks": (3.5, "Months"),
+    "1d 12h": (1.5, "Days"),
+    "unknown": (pd.NA, pd.NA),
+    "": (pd.NA, pd.NA),
+}
+
+
+def _same(a, b) -> bool:
+    return (pd.isna(a) and pd.isna(b)) or a == b
+
+
+def test_series_matches_scalar_on_corpus():
+    s = pd.Series(CORPUS, dtype=object)
+    out = parse_age_series(s)
+    assert list(out.columns) == ["age_value", "age_type"]
+    assert out.index.equals(s.index)
+    for i, raw in enumerate(CORPUS):
+        value, unit = parse_age(raw)
+        assert _same(out["age_value"].iloc[i], value), (raw, out["age_value"].iloc[i], value)
+        assert _same(out["age_type"].iloc[i], unit), (raw, out["age_type"].iloc[i], unit)
+
+
+@pytest.mark.parametrize("raw,expected", EXPECTED.items())
+def test_golden_values(raw, expected):
+    assert all(_same(got, want) for got, want in zip(parse_age(raw), expected))
+    row = parse_age_series(pd.Series([raw], dtype=object)).iloc[0]
+    assert _same(row["age_value"], expected[0]) and _same(row["age_type"], expected[1])
+
+
+def test_series_keeps_index_and_order():
+    s = pd.Series(CORPUS[::-1], index=np.arange(len(CORPUS))[::-1] * 3, dtype=object)
+    out = parse_age_series(s)
+    assert out.index.equals(s.index)
+    for label, raw in s.items():
+        assert _same(out.loc[label, "age_type"], parse_age(raw)[1]), (label, raw)
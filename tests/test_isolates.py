@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from analytics.isolates import first_isolate_rows, first_isolates
+
+BUGS = ['Escherichia coli', 'Klebsiella pneumoniae', 'Staphylococcus aureus']
+DRUGS = ['Ampicillin', 'Ciprofloxacin', 'Gentamicin']
+
+
+def _rows(n: int, seed: int = 0) -> pd.DataFrame:
+    """Random long-format results with missing patients ('nan' after cleaning), pathogens and dates."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'patient_id_key': pd.Series(rng.integers(0, n // 6, n)).astype(str),
+        'pathogen_clean': pd.Categorical(rng.choice(BUGS, n), categories=BUGS),
+        'sample_date_clean': pd.Timestamp('2024-01-01')
+                             + pd.to_timedelta(rng.integers(0, 200, n), 'D')
+                             + pd.to_timedelta(rng.integers(0, 24, n), 'h'),
+        'antibiotic_clean': pd.Categorical(rng.choice(DRUGS, n), categories=DRUGS),
+    })
+    df.loc[rng.random(n) < 0.03, 'patient_id_key'] = 'nan'
+    df.loc[rng.random(n) < 0.03, 'pathogen_clean'] = np.nan
+    df.loc[rng.random(n) < 0.03, 'sample_date_clean'] = pd.NaT
+    return df
+
+
+def _reference(df: pd.DataFrame, window_days=None) -> np.ndarray:
+    """Plain per-group loop: episode start days per patient + pathogen, one row per antibiotic."""
+    d = df.assign(pos=np.arange(len(df)), day=df['sample_date_clean'].dt.normalize())
+    d = d[(d['patient_id_key'] != 'nan') & d['pathogen_clean'].notna() & d['day'].notna()]
+    keep = []
+    for _, g in d.groupby(['patient_id_key', 'pathogen_clean'], observed=True):
+        start, seen = None, set()
+        for r in g.sort_values(['day', 'pos']).itertuples():
+            if start is None or (window_days and (r.day - start).days >= window_days):
+                start, seen = r.day, set()
+            if r.day == start and r.antibiotic_clean not in seen:
+                seen.add(r.antibiotic_clean)
+                keep.append(r.pos)
+    return np.sort(np.array(keep, dtype=np.int64))
+
+
+@pytest.mark.parametrize("window_days", [None, 30])
+def test_matches_per_group_loop(window_days):
+    df = _rows(3000)
+    np.testing.assert_array_equal(first_isolate_rows(df, window_days), _reference(df, window_days))
+
+
+def test_rows_without_patient_pathogen_or_date_are_left_out():
+    df = _rows(2000, seed=1)
+    kept = df.take(first_isolate_rows(df, 30))
+    assert not kept['patient_id_key'].isin(['nan']).any()
+    assert kept['pathogen_clean'].notna().all()
+    assert kept['sample_date_clean'].notna().all()
+
+
+def test_one_row_per_antibiotic_of_the_first_isolate():
+    df = pd.DataFrame({
+        'patient_id_key': ['P1'] * 5,
+        'pathogen_clean': ['Escherichia coli'] * 5,
+        'sample_date_clean': pd.to_datetime(['2024-01-01 08:00', '2024-01-01 09:00', '2024-01-01 10:00',
+                                             '2024-01-20 08:00', '2024-02-15 08:00']),
+        'antibiotic_clean': ['Ampicillin', 'Ampicillin', 'Gentamicin', 'Ampicillin', 'Ampicillin'],
+    })
+    assert first_isolate_rows(df).tolist() == [0, 2]
+    assert first_isolate_rows(df, window_days=30).tolist() == [0, 2, 4]      # 45 days later: new episode
+    assert len(first_isolates(df)) == 2
+
+
+def test_missing_columns_raise():
+    with pytest.raises(ValueError):
+        first_isolate_rows(pd.DataFrame({'patient_id_key': ['P1']}))
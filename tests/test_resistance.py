@@ -0,0 +1,86 @@
+import pandas as pd
+from analytics.isolates import isolate_table, classify_resistance
+from config import MDR_MIN_CLASSES
+from data.antibiotics import ABX_BIT, ABX_CLASSES, INTRINSIC_RESISTANCE, abx_mask, antibiotic_names
+
+
+def _results(results: dict, pathogen: str = 'Escherichia coli', patient: str = 'P1',
+             date: str = '2024-01-01', specimen: str = 'Urine') -> pd.DataFrame:
+    """Long-format rows of one isolate: {antibiotic: S/I/R}."""
+    return pd.DataFrame({
+        'patient_id_key': patient, 'sample_date_clean': pd.Timestamp(date), 'specimen_clean': specimen,
+        'pathogen_clean': pathogen, 'antibiotic_clean': list(results), 'sir_clean': list(results.values()),
+    })
+
+
+def _classify(results: dict, pathogen: str = 'Escherichia coli') -> pd.Series:
+    return classify_resistance(isolate_table(_results(results, pathogen))).iloc[0]
+
+
+def _full_panel(pathogen: str, sir: str) -> dict:
+    """One non-intrinsic agent of every applicable class, all with the same result."""
+    intrinsic = set(INTRINSIC_RESISTANCE.get(pathogen, ()))
+    panel = {}
+    for agents in ABX_CLASSES.values():
+        usable = [a for a in agents if a not in intrinsic]
+        if usable:
+            panel[usable[0]] = sir
+    return panel
+
+
+def test_isolate_table_masks_and_counts():
+    df = pd.concat([
+        _results({'Ampicillin': 'R', 'Gentamicin': 'S', 'Ciprofloxacin': 'I'}),
+        _results({'Meropenem': 'S'}, date='2024-01-01 18:00'),                  # same day: same isolate
+        _results({'Ampicillin': 'S'}, pathogen='Klebsiella pneumoniae'),
+        _results({'Ampicillin': 'R', 'Colistin': 'Unknown'}, patient='P2'),      # no S/I/R: not counted
+    ], ignore_index=True)
+    iso = isolate_table(df).set_index(['patient_id_key', 'pathogen_clean'])
+    assert len(iso) == 3
+    ecoli = iso.loc[('P1', 'Escherichia coli')]
+    assert ecoli['n_results'] == 4
+    assert ecoli['s_mask'] == abx_mask(['Gentamicin', 'Meropenem'])
+    assert ecoli['i_mask'] == ABX_BIT['Ciprofloxacin']
+    assert ecoli['r_mask'] == ABX_BIT['Ampicillin']
+    assert iso.loc[('P2', 'Escherichia coli'), 'n_results'] == 1
+
+
+def test_intrinsic_resistance_is_excluded():
+    # vancomycin, clindamycin and erythromycin are intrinsic for E. coli
+    row = _classify({'Vancomycin': 'R', 'Clindamycin': 'R', 'Erythromycin': 'R', 'Gentamicin': 'S'})
+    assert row['classes_nonsusceptible'] == 0
+    assert row['category'] == 'Non-MDR'
+
+
+def test_mdr_threshold():
+    drugs = ['Ciprofloxacin', 'Ceftriaxone', 'Gentamicin', 'Co-trimoxazole']
+    below = _classify({d: 'R' for d in drugs[:MDR_MIN_CLASSES - 1]} | {'Meropenem': 'S'})
+    at = _classify({d: 'R' for d in drugs[:MDR_MIN_CLASSES]} | {'Meropenem': 'S'})
+    assert not below['mdr'] and at['mdr']
+    assert at['classes_nonsusceptible'] == MDR_MIN_CLASSES
+
+
+def test_small_panels_are_not_xdr_or_pdr():
+    pdr_like = _classify({'Ciprofloxacin': 'R', 'Ceftriaxone': 'R', 'Gentamicin': 'R'})
+    xdr_like = _classify({'Meropenem': 'S', 'Ampicillin': 'S', 'Ciprofloxacin': 'R', 'Ceftriaxone': 'R',
+                          'Gentamicin': 'R', 'Co-trimoxazole': 'R'})
+    for row in (pdr_like, xdr_like):
+        assert row['mdr'] and not row['xdr'] and not row['pdr']
+        assert not row['panel_complete']
+        assert row['category'] == 'MDR'
+
+
+def test_full_panels_reach_xdr_and_pdr():
+    pdr = _classify(_full_panel('Escherichia coli', 'R'))
+    assert pdr['panel_complete'] and pdr['pdr'] and pdr['category'] == 'PDR'
+    panel = _full_panel('Escherichia coli', 'R')
+    for agent in list(panel)[:2]:
+        panel[agent] = 'S'
+    xdr = _classify(panel)
+    assert xdr['xdr'] and not xdr['pdr'] and xdr['category'] == 'XDR'
+
+
+def test_antibiotic_names_round_trip():
+    names = ['Amikacin', 'Meropenem', 'Vancomycin']
+    assert antibiotic_names(abx_mask(names)) == names
+    assert antibiotic_names(abx_mask([])) == []
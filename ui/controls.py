@@ -1,8 +1,20 @@
-
+import os
+import shutil
+import threading
 import pandas as pd
 import streamlit as st
-from data.pipeline import clean_data
+from config import (STREAM_THRESHOLD_MB, STREAM_CHUNK_ROWS, STORE_DIR, STORE_MAX_MB,
+                    CLEAN_WORKERS, CLEAN_MIN_ROWS_PER_WORKER, CACHE_DIR, CACHE_MAX_MB,
+                    CUMULATIVE_STORE, KEEP_RAW_COLUMNS, REGISTRY_MAX_MB)
+from data.pipeline import CLEAN_COLUMNS
+from data.parallel import clean_data_parallel
+from data.store import ingest_csv, load_store, read_meta, append_batch, read_raw, read_cube
+from data.cache import cache_key, cache_get, cache_put, file_digest, evict
+from data.bitmaps import FilterIndex
+from data.registry import get_dataset
+from analytics.cube import build_cube, build_patient_sets, cube_from_counts, filter_cube
 from data.demo import get_demo_df
+from profiling import profiled
 
 
 def multiselect_with_all(label: str, options: list, state_key: str,
@@ -44,15 +56,122 @@ def multiselect_with_all(label: str, options: list, state_key: str,
     return options if all_selected else sel
 
 
-@st.cache_data(show_spinner=False)
-def _clean_cached(df_raw: pd.DataFrame) -> pd.DataFrame:
-    return clean_data(df_raw)
+# Cleaned datasets come from the process-wide registry (data/registry.py): one
+# read-only frame per content key, built once and shared by every session.
+
+def _shared(key: str, build) -> pd.DataFrame:
+    return get_dataset(key, build, REGISTRY_MAX_MB * 1024**2)
+
+@profiled("clean (demo)")
+def _clean_demo(df_raw: pd.DataFrame) -> pd.DataFrame:
+    return clean_data_parallel(df_raw, workers=CLEAN_WORKERS,
+                               min_rows_per_worker=CLEAN_MIN_ROWS_PER_WORKER, keep_raw=KEEP_RAW_COLUMNS)
+
+@profiled("read file")
+def _read_raw(file, nrows: int = None) -> pd.DataFrame:
+    return read_raw(file, nrows=nrows)
+
+@profiled("clean file")
+def _clean_file(key: str, file) -> pd.DataFrame:
+    """
+    Cleaned frame for an uploaded file, addressed by `key` (file bytes + cleaner
+    version): loaded from the on-disk cache when present, else read, cleaned and
+    stored there. Called by the registry only when no session holds `key` yet.
+    """
+    df = cache_get(CACHE_DIR, key)
+    if df is None:
+        df = clean_data_parallel(_read_raw(file), workers=CLEAN_WORKERS,
+                                 min_rows_per_worker=CLEAN_MIN_ROWS_PER_WORKER, keep_raw=KEEP_RAW_COLUMNS)
+        cache_put(CACHE_DIR, key, df, CACHE_MAX_MB * 1024**2)
+    return df
+
+@st.cache_resource(show_spinner=False)
+def _ingest_cached(key: str, _file) -> str:
+    """Stream a large CSV into the on-disk store for `key` (reused if already ingested); returns the store path."""
+    store_dir = os.path.join(STORE_DIR, key)
+    if read_meta(store_dir)["rows"] > 0:
+        return store_dir
+    shutil.rmtree(store_dir, ignore_errors=True)
+    try:
+        _file.seek(0); ingest_csv(_file, store_dir, chunksize=STREAM_CHUNK_ROWS)
+    except UnicodeDecodeError:
+        shutil.rmtree(store_dir, ignore_errors=True)
+        _file.seek(0); ingest_csv(_file, store_dir, chunksize=STREAM_CHUNK_ROWS, encoding='latin1')
+    evict(STORE_DIR, STORE_MAX_MB * 1024**2, keep=key, pattern="*")
+    return store_dir
+
+def _ingest(key: str, file) -> str:
+    """Store for `key`, marked as recently used; ingested again if it was evicted meanwhile."""
+    store_dir = _ingest_cached(key, file)
+    if read_meta(store_dir)["rows"] == 0:
+        _ingest_cached.clear()
+        store_dir = _ingest_cached(key, file)
+    os.utime(store_dir)
+    return store_dir
+
+@profiled("load store")
+def _load_store(store_dir: str) -> pd.DataFrame:
+    """Completed store (shared under a key that changes with every append, see upload_data)."""
+    df = load_store(store_dir, columns=CLEAN_COLUMNS)
+    report = pd.DataFrame(read_meta(store_dir)["report"])
+    if not report.empty:
+        report = (report.groupby(['column', 'target'], sort=False)
+                        .agg(rows=('rows', 'sum'), distinct=('distinct', 'max'), seconds=('seconds', 'sum'))
+                        .reset_index())
+        df.attrs['clean_report'] = report.to_dict('records')
+    df.attrs['cube_store'] = store_dir      # filtered_cube reads the store's own cube when it keeps one
+    return df
+
+def _load_streamed(file, key: str) -> pd.DataFrame:
+    """Large CSV: clean chunk by chunk into a Parquet store, then load only the cleaned columns."""
+    size_mb = file.size / 1024**2
+    with st.spinner(f"Large file ({size_mb:,.0f} MB): streaming in chunks of {STREAM_CHUNK_ROWS:,} rows..."):
+        store_dir = _ingest(key, file)
+        df = _shared(key, lambda: _load_store(store_dir))
+    st.success(f"Streamed {len(df):,} rows into a columnar store (cleaned columns only)")
+    return df
+
+_append_lock = threading.Lock()     # one append to the cumulative store at a time, across sessions
+_BATCH_IDS = "_cumulative_batch_ids"   # session_state: uploaded file_id -> content key (hashed once)
+
+@profiled("append + load cumulative")
+def _load_cumulative(file) -> pd.DataFrame:
+    """
+    Append the uploaded submission to the cumulative store, then load it. The
+    upload is hashed once per session and only read, cleaned and appended if the
+    store doesn't have it yet, so reruns (filter clicks) only load the store.
+    """
+    kind = "excel" if file.name.lower().endswith((".xlsx",".xls")) else "csv"
+    batch_ids = st.session_state.setdefault(_BATCH_IDS, {})
+    first_seen = file.file_id not in batch_ids
+    if first_seen:
+        batch_ids[file.file_id] = cache_key(file.getvalue(), kind)
+    batch_id = batch_ids[file.file_id]
+    if batch_id not in read_meta(CUMULATIVE_STORE)["batches"]:
+        with st.spinner("Cleaning new submission + updating affected patients..."), _append_lock:
+            # append_batch checks again under the lock: another session may have just added it
+            res = append_batch(CUMULATIVE_STORE, _read_raw(file), batch_id=batch_id)
+        if res["skipped"]:
+            st.info("This file is already in the cumulative store")
+        else:
+            st.success(f"Appended {res['rows']:,} rows ({res['patients']:,} patients); "
+                       f"cube updated for {len(res['slices'])} year × facility slices")
+    elif first_seen:
+        st.info("This file is already in the cumulative store")
+    meta = read_meta(CUMULATIVE_STORE)
+    st.caption(f"Cumulative store: {meta['rows']:,} rows from {len(meta.get('batches', []))} files")
+    return _shared(_cumulative_key(meta), lambda: _load_store(CUMULATIVE_STORE))
+
+def _cumulative_key(meta: dict) -> str:
+    return f"cumulative-{meta['parts']}-{file_digest('|'.join(meta['batches']).encode())}"
 
 def upload_data():
     """Render an uploader in the main content area (center). Returns cleaned df or None."""
     with st.expander("📤 Upload data", expanded=True):
         file = st.file_uploader("CSV or Excel", type=["csv","xlsx","xls"], key="main_uploader")
         use_demo = st.checkbox("Use demo data", value=False, key="use_demo_center")
+        cumulative = st.checkbox("Append to cumulative store (monthly submissions)", value=False,
+                                 key="use_cumulative")
 
     if not file and not use_demo:
         return None
@@ -60,77 +179,120 @@ def upload_data():
     # Load
     if use_demo:
         df_raw = get_demo_df()
-    else:
-        if file.name.lower().endswith((".xlsx",".xls")):
-            df_raw = pd.read_excel(file)
-        else:
-            try:
-                df_raw = pd.read_csv(file)
-            except Exception:
-                file.seek(0); df_raw = pd.read_csv(file, encoding='latin1')
+        st.success(f"Loaded {len(df_raw):,} rows × {len(df_raw.columns)} columns")
+        with st.expander("Preview: raw data", expanded=False):
+            st.dataframe(df_raw.head(20), use_container_width=True)
+        with st.spinner("Cleaning + completing patient fields..."):
+            df = _shared("demo", lambda: _clean_demo(df_raw))
+        return _show_report(df, "demo")
 
-    st.success(f"Loaded {len(df_raw):,} rows × {len(df_raw.columns)} columns")
-    with st.expander("Preview: raw data", expanded=False):
-        st.dataframe(df_raw.head(20), use_container_width=True)
+    if cumulative:
+        df = _load_cumulative(file)
+        return _show_report(df, _cumulative_key(read_meta(CUMULATIVE_STORE)))
 
+    if file.name.lower().endswith(".csv") and file.size > STREAM_THRESHOLD_MB * 1024**2:
+        key = cache_key(file.getvalue(), "stream")
+        df = _load_streamed(file, key)
+        return _show_report(df, key)
+
+    kind = "excel" if file.name.lower().endswith((".xlsx",".xls")) else "csv"
+    key = cache_key(file.getvalue(), kind)
     with st.spinner("Cleaning + completing patient fields..."):
-        df = _clean_cached(df_raw)
+        df = _shared(key, lambda: _clean_file(key, file))
+
+    preview = _read_raw(file, nrows=20)
+    st.success(f"Loaded {len(df):,} rows × {len(preview.columns)} columns")
+    with st.expander("Preview: raw data", expanded=False):
+        st.dataframe(preview, use_container_width=True)
+
+    return _show_report(df, key)
 
+def _show_report(df: pd.DataFrame, dataset_key: str = None) -> pd.DataFrame:
+    # dataset_key identifies the loaded dataset for per-dataset caches (filter index);
+    # shared frames carry their registry key already
+    if dataset_key is not None and df.attrs.get('dataset_key') != dataset_key:
+        df.attrs['dataset_key'] = dataset_key
+    report = df.attrs.get('clean_report')
+    if report:
+        with st.expander("Cleaning report: distinct values & time per column", expanded=False):
+            st.dataframe(pd.DataFrame(report), use_container_width=True)
     return df
+
+# (label, column, widget state key), applied in this order; each filter's options
+# only list values left by the filters above it
+FILTERS = [
+    ("Year",         'year_clean',        "flt_years"),
+    ("HCF_ID",       'hcf_id_clean',      "flt_hcf"),
+    ("Facility",     'facility_clean',    "flt_fac"),
+    ("Patient type", 'patienttype_clean', "flt_pt"),
+    ("Specimen",     'specimen_clean',    "flt_spec"),
+    ("Antibiotic",   'antibiotic_clean',  "flt_abx"),
+    ("Gender",       'gender_clean',      "flt_gender"),
+]
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _filter_index_cached(key: str, _df: pd.DataFrame) -> FilterIndex:
+    return FilterIndex(_df, [col for _, col, _ in FILTERS])
+
+@profiled("filter index")
+def _filter_index(df: pd.DataFrame) -> FilterIndex:
+    """Filter index of `df`, built once per dataset (keyed by attrs['dataset_key'] when set)."""
+    key = df.attrs.get('dataset_key')
+    if key is None:
+        return FilterIndex(df, [col for _, col, _ in FILTERS])
+    return _filter_index_cached(f"{key}:{len(df)}", df)
+
+@profiled("filters")
 def filters_panel(df: pd.DataFrame):
+    """
+    Cascading filters resolved on the dataset's bitmap index (data/bitmaps.py):
+    options and row masks come from the index, and the frame is touched once,
+    by a single row take. The selections are kept in df_f.attrs['filters'].
+    The returned frame may share data with `df`; do not modify it in place.
+    """
     if df is None:
         return None
 
-    df_f = df.copy()
     st.subheader("Filters")
+    index = _filter_index(df)
+    selections = {}
+    for label, col, state_key in FILTERS:
+        if col not in index.columns:
+            continue
+        options = index.options(col, selections)
+        if not options:
+            continue
+        sel = multiselect_with_all(label, options, state_key, default_all=True)
+        if sel:
+            selections[col] = sel
 
-    # Year
-    if 'year_clean' in df_f.columns and df_f['year_clean'].notna().any():
-        years = sorted(df_f['year_clean'].dropna().unique().tolist())
-        sel_years = multiselect_with_all("Year", years, "flt_years", default_all=True)
-        if sel_years:
-            df_f = df_f[df_f['year_clean'].isin(sel_years)]
-
-    # HCF_ID
-    if 'hcf_id_clean' in df_f.columns and df_f['hcf_id_clean'].notna().any():
-        hcfs = sorted(df_f['hcf_id_clean'].dropna().unique().tolist())
-        sel_hcf = multiselect_with_all("HCF_ID", hcfs, "flt_hcf", default_all=True)
-        if sel_hcf:
-            df_f = df_f[df_f['hcf_id_clean'].isin(sel_hcf)]
-
-    # Facility
-    if 'facility_clean' in df_f.columns and df_f['facility_clean'].notna().any():
-        facs = sorted(df_f['facility_clean'].dropna().unique().tolist())
-        sel_fac = multiselect_with_all("Facility", facs, "flt_fac", default_all=True)
-        if sel_fac:
-            df_f = df_f[df_f['facility_clean'].isin(sel_fac)]
-
-    # Patient type
-    if 'patienttype_clean' in df_f.columns and df_f['patienttype_clean'].notna().any():
-        pts = sorted(df_f['patienttype_clean'].dropna().unique().tolist())
-        sel_pt = multiselect_with_all("Patient type", pts, "flt_pt", default_all=True)
-        if sel_pt:
-            df_f = df_f[df_f['patienttype_clean'].isin(sel_pt)]
-
-    # Specimen
-    if 'specimen_clean' in df_f.columns and df_f['specimen_clean'].notna().any():
-        specs = sorted(df_f['specimen_clean'].dropna().unique().tolist())
-        sel_sp = multiselect_with_all("Specimen", specs, "flt_spec", default_all=True)
-        if sel_sp:
-            df_f = df_f[df_f['specimen_clean'].isin(sel_sp)]
-
-    # NEW: Antibiotic
-    if 'antibiotic_clean' in df_f.columns and df_f['antibiotic_clean'].notna().any():
-        abx = sorted(df_f['antibiotic_clean'].dropna().unique().tolist())
-        sel_abx = multiselect_with_all("Antibiotic", abx, "flt_abx", default_all=True)
-        if sel_abx:
-            df_f = df_f[df_f['antibiotic_clean'].isin(sel_abx)]
-
-    # Gender
-    if 'gender_clean' in df_f.columns and df_f['gender_clean'].notna().any():
-        gens = sorted(df_f['gender_clean'].dropna().unique().tolist())
-        sel_g = multiselect_with_all("Gender", gens, "flt_gender", default_all=True)
-        if sel_g:
-            df_f = df_f[df_f['gender_clean'].isin(sel_g)]
-
+    rows = index.rows(selections)
+    df_f = df.copy(deep=False) if rows is None else df.take(rows)
+    df_f.attrs = {**df.attrs, 'filters': selections}
     return df_f
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _cube_cached(key: str, _df: pd.DataFrame):
+    return build_cube(_df), build_patient_sets(_df)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _store_cube_cached(key: str, store_dir: str):
+    counts = read_cube(store_dir)
+    return None if counts is None else cube_from_counts(counts)
+
+@profiled("cube")
+def filtered_cube(df: pd.DataFrame, df_f: pd.DataFrame):
+    """
+    The dataset's AMR cube (built once per dataset; for a store that keeps its
+    cube, read from the store instead of aggregating the rows) rolled up to the
+    filters applied to df_f, and the cube cells' patient sets (None without patient IDs).
+    """
+    key = df.attrs.get('dataset_key')
+    built = None
+    if key is not None and df.attrs.get('cube_store'):
+        built = _store_cube_cached(f"{key}:{len(df)}", df.attrs['cube_store'])
+    if built is None:
+        built = (build_cube(df), build_patient_sets(df)) if key is None \
+            else _cube_cached(f"{key}:{len(df)}", df)
+    cube, patients = built
+    return filter_cube(cube, df_f.attrs.get('filters')), patients
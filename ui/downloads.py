@@ -0,0 +1,36 @@
+import streamlit as st
+from config import EXPORT_DIR, EXPORT_MAX_MB, STREAM_CHUNK_ROWS
+from data.export import export_file, export_format
+from visuals.export import DEFERRED_DOWNLOADS
+
+# Cleaned-dataset download formats (label -> file extension)
+DATASET_FORMATS = {
+    "CSV": ".csv",
+    "CSV (gzip)": ".csv.gz",
+    "Parquet": ".parquet",
+    "Excel": ".xlsx",
+}
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+def download_table(label: str, frames, file_name: str, signature, key: str = None, container=None):
+    """
+    Download button for a table, serialized only when clicked and at most once per
+    (signature, file_name): the file is written to EXPORT_DIR in chunks and reused
+    by later clicks. Format follows the extension (.csv, .csv.gz, .parquet, .xlsx).
+    `frames` is a frame, {sheet: frame} (xlsx) or a callable returning one;
+    `signature` identifies its content, e.g. (filter_signature(df_f), sort option).
+    """
+    area = container if container is not None else st
+    mime, _ = export_format(file_name)
+    key = key or f"dl_{file_name}"
+    build = lambda: _read(export_file(EXPORT_DIR, file_name, signature, frames,
+                                      EXPORT_MAX_MB * 1024 * 1024, STREAM_CHUNK_ROWS))
+    if DEFERRED_DOWNLOADS:
+        area.download_button(label, data=build, file_name=file_name, mime=mime, key=key, on_click="ignore")
+    elif area.button(label, key=f"prep_{key}"):
+        area.download_button(f"📥 {file_name}", data=build(), file_name=file_name, mime=mime, key=key)
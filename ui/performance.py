@@ -0,0 +1,58 @@
+import pandas as pd
+import streamlit as st
+from config import PROFILE, PROFILE_LOG
+from profiling import start_run, records, run_seconds, append_log
+from data.registry import registry_stats
+
+
+def performance_controls(container=None) -> bool:
+    """
+    Sidebar switches for the Performance panel; call at the top of a page so the
+    whole rerun (reading, cleaning, filters, tabs, exports) is timed.
+    """
+    area = container if container is not None else st.sidebar
+    on = area.toggle("⏱ Performance panel", value=PROFILE, key="perf_on")
+    memory = on and area.checkbox("Track memory (slower)", value=False, key="perf_memory")
+    start_run(on, memory)
+    return on
+
+
+def stage_table(recs: list) -> pd.DataFrame:
+    """Stage records as a display table, nested stages indented under their caller."""
+    rows = []
+    for r in recs:
+        if r["seconds"] is None:      # still running (the panel itself)
+            continue
+        n, s = r["rows"], r["seconds"]
+        rows.append({
+            "Stage": " " * r["depth"] + r["stage"],
+            "ms": round(s * 1000, 1),
+            "Rows": n,
+            "Rows/s": round(n / s) if n and s > 0 else None,
+            "Peak MB": r["peak_mb"],
+        })
+    return pd.DataFrame(rows, columns=["Stage", "ms", "Rows", "Rows/s", "Peak MB"])
+
+
+def performance_panel(on: bool, container=None, **context):
+    """Timings of this rerun; `context` (page, dataset, rows, ...) goes into the JSONL log."""
+    if not on:
+        return
+    area = container if container is not None else st
+    recs = records()
+    with area.expander("⏱ Performance", expanded=True):
+        total = run_seconds()
+        top = sum(r["seconds"] or 0 for r in recs if r["depth"] == 0)
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Rerun", f"{total * 1000:,.0f} ms")
+        c2.metric("Timed stages", f"{top * 1000:,.0f} ms")
+        c3.metric("Stages", f"{len(recs):,}")
+        if recs:
+            st.dataframe(stage_table(recs), use_container_width=True, hide_index=True)
+        else:
+            st.caption("Nothing recomputed on this rerun (all results came from caches).")
+        reg = registry_stats()
+        st.caption(f"Shared datasets in this process: {reg['datasets']} ({reg['mb']:,} MB) — "
+                   f"{reg['builds']} built, {reg['hits']} reused, {reg['waits']} waited on a running build")
+        if st.checkbox(f"Append each rerun to {PROFILE_LOG}", key="perf_log"):
+            append_log(**context)
@@ -0,0 +1,93 @@
+import json
+import hashlib
+import inspect
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import streamlit as st
+from config import TAB_MEMO_MAX_MB
+from profiling import stage
+
+# st.tabs(on_change="rerun") runs only the selected tab (newer Streamlit);
+# older versions get a horizontal radio that behaves the same way.
+_NATIVE_LAZY = "on_change" in inspect.signature(st.tabs).parameters
+
+_MEMO_KEY = "_tab_memo"
+_MEMO_SIZE = 48
+
+
+class _RadioTab:
+    """Fallback tab: a container that is `open` only for the selected label."""
+
+    def __init__(self, open_: bool):
+        self.open = open_
+        self._container = st.container() if open_ else None
+
+    def __enter__(self):
+        return self._container.__enter__() if self.open else self
+
+    def __exit__(self, *exc):
+        return self._container.__exit__(*exc) if self.open else False
+
+
+def lazy_tabs(labels: list, key: str = "tabs") -> list:
+    """
+    Tabs whose bodies run only when selected. Each returned tab has an `.open`
+    flag; wrap the body in `with tab:` + `if tab.open:` so a rerun (e.g. a
+    filter click) only pays for the visible tab.
+    """
+    if _NATIVE_LAZY:
+        return st.tabs(labels, key=key, on_change="rerun")
+    choice = st.radio("View", labels, horizontal=True, key=key, label_visibility="collapsed")
+    return [_RadioTab(label == choice) for label in labels]
+
+
+def filter_signature(df_f) -> str:
+    """Short hash of the loaded dataset + current filter selections (df_f.attrs)."""
+    sig = {
+        "dataset": df_f.attrs.get("dataset_key"),
+        "rows": len(df_f),
+        "filters": {c: sorted(map(str, v)) for c, v in (df_f.attrs.get("filters") or {}).items()},
+    }
+    return hashlib.blake2b(json.dumps(sig, sort_keys=True, default=str).encode(), digest_size=12).hexdigest()
+
+
+def _nbytes(value) -> int:
+    """Approximate memory held by a memoized result (frames deep, figures by their JSON spec)."""
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if hasattr(value, "to_json"):         # plotly figures carry their data arrays
+        return len(value.to_json())
+    return 0
+
+
+def memo(name: str, signature: str, compute, *extra):
+    """
+    Result of compute() memoized per session under (name, signature, *extra),
+    so switching back to a tab with unchanged filters is instant. Keeps the
+    most recently used results, at most _MEMO_SIZE of them and TAB_MEMO_MAX_MB
+    in total (a result larger than that is not kept). Treat returned objects as read-only.
+    """
+    store = st.session_state.setdefault(_MEMO_KEY, OrderedDict())   # key -> (value, bytes)
+    key = (name, signature) + tuple(extra)
+    if key in store:
+        store.move_to_end(key)
+        return store[key][0]
+    with stage(f"tab {name}"):
+        value = compute()
+    size = _nbytes(value)
+    max_bytes = TAB_MEMO_MAX_MB * 1024**2
+    if size > max_bytes:
+        return value
+    store[key] = (value, size)
+    total = sum(s for _, s in store.values())
+    while len(store) > _MEMO_SIZE or total > max_bytes:
+        total -= store.popitem(last=False)[1][1]
+    return value
@@ -1,29 +1,18 @@
 import plotly.express as px
-import streamlit as st
-import kaleido
+from visuals.export import download_buttons
+import numpy as np
 import pandas as pd
 from pandas.api.types import is_numeric_dtype
 import plotly.express as px
+from profiling import profiled
 
-def download_buttons(fig, base_name: str, container=None):
-    area = container if container is not None else st
-    png_bytes = None
-    try:
-        png_bytes = fig.to_image(format="png", scale=2)  # requires kaleido
-    except Exception:
-        png_bytes = None
-    html_bytes = fig.to_html(include_plotlyjs='cdn', full_html=True).encode('utf-8')
-    if png_bytes is not None:
-        area.download_button("📥 PNG", data=png_bytes, file_name=f"{base_name}.png", mime="image/png")
-    else:
-        area.caption("PNG export requires the 'kaleido' package. Skipping PNG button.")
-    area.download_button("📥 HTML", data=html_bytes, file_name=f"{base_name}.html", mime="text/html")
-
+@profiled()
 def bar_count(df, x, y, title, textcol='Count'):
     fig = px.bar(df, x=x, y=y, title=title, text=textcol)
     fig.update_traces(textposition='outside', cliponaxis=False)
     return fig
 
+@profiled()
 def pie(df, names, values, title):
     fig = px.pie(df, names=names, values=values, title=title)
     fig.update_traces(textinfo='label+percent+value')
@@ -34,50 +23,71 @@ def pie(df, names, values, title):
 #     fig.update_traces(texttemplate='%{y}', textposition='outside')
 #     return fig
 
+def _category_counts(s: pd.Series) -> pd.Series:
+    """Counts per label (missing -> 'Unknown'); categoricals keep their category order, else first appearance."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes = s.cat.codes.to_numpy()
+        counts = pd.Series(np.bincount(codes[codes >= 0], minlength=len(s.cat.categories)),
+                           index=s.cat.categories.astype(str))
+        counts = counts[counts > 0]
+        n_missing = int((codes < 0).sum())
+    else:
+        counts = s.dropna().astype(str).value_counts(sort=False)
+        n_missing = int(s.isna().sum())
+    if n_missing:
+        counts["Unknown"] = counts.get("Unknown", 0) + n_missing
+    return counts.astype(int)
+
+
+@profiled()
 def histogram(df, x, nbins=30, title="", sort="none", custom_order=None):
     """
+    Counts of `x` drawn as a bar chart, aggregated here so the figure carries one
+    bar per category (or bin) instead of every row.
+
     sort: "none" | "count_desc" | "count_asc" | "alpha_asc" | "alpha_desc" | "custom"
+          ("none": category order of a categorical x, else order of appearance)
     custom_order: list of category labels for x (used when sort="custom")
+    Numeric x is binned into `nbins` equal-width bins (sort is ignored).
     """
-    g = df.copy()
-
-    # Handle categorical sorting
-    if x in g.columns and not is_numeric_dtype(g[x]):
-        s = g[x].astype("string").fillna("Unknown")
-        g[x] = s  # ensure plotted values match order calc
-
+    s = df[x]
+    if is_numeric_dtype(s) and not isinstance(s.dtype, pd.CategoricalDtype):
+        vals = s.dropna().to_numpy(dtype=float)
+        counts, edges = np.histogram(vals, bins=nbins) if len(vals) else (np.array([], int), np.array([0.0]))
+        g = pd.DataFrame({x: (edges[:-1] + edges[1:]) / 2, "count": counts})
+        fig = px.bar(g, x=x, y="count", title=title, text="count")
+        fig.update_traces(width=np.diff(edges), textposition='outside')
+    else:
+        counts = _category_counts(s)
         if sort == "count_desc":
-            order = s.value_counts().index.tolist()
+            counts = counts.sort_values(ascending=False, kind="stable")
         elif sort == "count_asc":
-            order = s.value_counts(ascending=True).index.tolist()
+            counts = counts.sort_values(ascending=True, kind="stable")
         elif sort == "alpha_asc":
-            order = sorted(s.dropna().unique().tolist())
+            counts = counts.sort_index()
         elif sort == "alpha_desc":
-            order = sorted(s.dropna().unique().tolist(), reverse=True)
+            counts = counts.sort_index(ascending=False)
         elif sort == "custom" and custom_order:
-            order = list(custom_order)
-        else:
-            order = None
-    else:
-        order = None  # numeric: keep default bin order
-
-    fig = px.histogram(g, x=x, nbins=nbins, title=title)
-    fig.update_traces(texttemplate='%{y}', textposition='outside')
-
-    if order:
-        fig.update_xaxes(categoryorder="array", categoryarray=order)
+            order = [c for c in custom_order if c in counts.index]
+            counts = counts.reindex(order + [c for c in counts.index if c not in order])
+        g = counts.rename_axis(x).reset_index(name="count")
+        fig = px.bar(g, x=x, y="count", title=title, text="count")
+        fig.update_traces(textposition='outside')
+        fig.update_xaxes(type="category", categoryorder="array", categoryarray=g[x].tolist())
 
     # Improve readability a bit
     fig.update_layout(uniformtext_minsize=10, uniformtext_mode="hide", bargap=0.05)
     return fig
 
 
+@profiled()
 def heatmap_from_matrix(piv, title):
     return px.imshow(piv, aspect='auto', text_auto=True, origin='upper', title=title)
 
 import pandas as pd
 import plotly.express as px
 
+@profiled()
 def stacked_100(
     df: pd.DataFrame,
     x: str,
@@ -92,30 +102,34 @@ def stacked_100(
     if stack is None:
         raise ValueError("Provide the `stack` column (the category to stack).")
 
-    g = df.copy()
-
-    # aggregate: either counts or sum of a numeric `value`
+    # aggregate (no copy of the rows): either counts or sum of a numeric `value`
     if value is None:
         agg = (
-            g.groupby([x, stack], dropna=False)
-             .size()
-             .reset_index(name="n")
+            df.groupby([x, stack], dropna=False, observed=True)
+              .size()
+              .reset_index(name="n")
         )
     else:
         agg = (
-            g.groupby([x, stack], dropna=False)[value]
-             .sum()
-             .reset_index(name="n")
+            df.groupby([x, stack], dropna=False, observed=True)[value]
+              .sum()
+              .reset_index(name="n")
         )
 
     # percent within each x
-    totals = agg.groupby(x)["n"].transform("sum")
+    totals = agg.groupby(x, observed=True)["n"].transform("sum")
     agg["pct"] = agg["n"] / totals * 100
 
     # tidy labels
     x_label = x.replace("_", " ").title()
     stack_label = stack.replace("_", " ").title()
 
+    # categorical x keeps its category order (e.g. age bands), other x is sorted
+    if isinstance(df[x].dtype, pd.CategoricalDtype):
+        x_order = [c for c in df[x].cat.categories if c in set(agg[x])]
+    else:
+        x_order = sorted(agg[x].dropna().unique().tolist())
+
     fig = px.bar(
         agg,
         x=x,
@@ -124,8 +138,9 @@ def stacked_100(
         barmode="stack",
         title=title,
         labels={"pct": "Percent", x: x_label, stack: stack_label},
-        category_orders={x: sorted(agg[x].dropna().unique().tolist())}
+        category_orders={x: x_order}
     )
-    fig.update_traces(text=agg["pct"].round(1).astype(str) + "%", textposition="inside")
+    # one trace per stack value: label each bar segment with its own percent
+    fig.update_traces(texttemplate="%{y:.1f}%", textposition="inside")
     fig.update_layout(yaxis=dict(ticksuffix="%"), bargap=0.15, legend_title=stack_label)
     return fig
@@ -0,0 +1,188 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+import plotly.io as pio
+import streamlit as st
+from profiling import profiled
+
+# Chart export: PNG/HTML bytes are rendered only when a download is requested,
+# cached by a hash of the figure spec, and PNGs go through one warm kaleido.
+
+PNG_SCALE = 2
+RENDER_TABS = 4          # parallel kaleido tabs used for "export all"
+_CACHE_SIZE = 128        # rendered files kept in memory (process-wide)
+_CHARTS_KEY = "_export_charts"
+
+# st.download_button(data=callable) defers generation to the click (Streamlit >= 1.50)
+DEFERRED_DOWNLOADS = tuple(int(p) for p in st.__version__.split(".")[:2]) >= (1, 50)
+
+_cache = OrderedDict()           # (spec hash, format) -> bytes
+_cache_lock = threading.Lock()
+_render_lock = threading.Lock()  # kaleido serves one request at a time
+_kaleido_warm = False
+_png_ok = None                   # PNG export works here (probed once, see png_export_available)
+
+
+def figure_key(fig) -> str:
+    """Hash of the figure spec (data + layout); equal figures share rendered files."""
+    return hashlib.blake2b(fig.to_json().encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _cached(key, render):
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    data = render()
+    with _cache_lock:
+        _cache[key] = data
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return data
+
+
+def _warm_kaleido():
+    """
+    Keep one kaleido (>= 1.0) browser running after the first successful render,
+    instead of starting Chrome for every image. Older kaleido keeps its own
+    process alive already.
+    """
+    global _kaleido_warm
+    if _kaleido_warm:
+        return
+    _kaleido_warm = True
+    try:
+        import kaleido
+        if hasattr(kaleido, "start_sync_server"):
+            kaleido.start_sync_server(n=RENDER_TABS, silence_warnings=True)
+    except Exception:
+        pass
+
+
+def png_export_available() -> bool:
+    """
+    Whether figures can be rendered to PNG (kaleido installed and able to start
+    its browser). Probed once per process with a tiny figure, which also warms kaleido.
+    """
+    global _png_ok
+    if _png_ok is None:
+        try:
+            import plotly.graph_objects as go
+            _render_png(go.Figure(layout={"width": 10, "height": 10}))
+            _png_ok = True
+        except Exception:
+            _png_ok = False
+    return _png_ok
+
+
+def _render_png(fig) -> bytes:
+    with _render_lock:
+        png = fig.to_image(format="png", scale=PNG_SCALE)   # requires kaleido
+        _warm_kaleido()
+    return png
+
+
+@profiled()
+def chart_png(fig) -> bytes:
+    """PNG bytes of a figure (rendered once per distinct spec)."""
+    return _cached((figure_key(fig), "png"), lambda: _render_png(fig))
+
+
+@profiled()
+def chart_html(fig) -> bytes:
+    """Standalone HTML of a figure (plotly.js from CDN)."""
+    return _cached((figure_key(fig), "html"),
+                   lambda: fig.to_html(include_plotlyjs="cdn", full_html=True).encode("utf-8"))
+
+
+def _render_pngs(figs: dict) -> dict:
+    """PNG bytes for {name: fig}; uncached figures are rendered in one parallel kaleido batch."""
+    keys = {name: (figure_key(fig), "png") for name, fig in figs.items()}
+    with _cache_lock:
+        out = {name: _cache[k] for name, k in keys.items() if k in _cache}
+    todo = [name for name in figs if name not in out]
+    if todo and not _kaleido_warm:
+        out[todo[0]] = chart_png(figs[todo[0]])   # proves kaleido works, then keeps it warm
+        todo = todo[1:]
+    if len(todo) > 1 and hasattr(pio, "write_images"):
+        with tempfile.TemporaryDirectory() as tmp, _render_lock:
+            paths = [os.path.join(tmp, f"{i}.png") for i in range(len(todo))]
+            pio.write_images([figs[n] for n in todo], paths, format="png", scale=PNG_SCALE)
+            for name, path in zip(todo, paths):
+                with open(path, "rb") as fh:
+                    out[name] = _cached(keys[name], fh.read)
+    else:
+        for name in todo:
+            out[name] = chart_png(figs[name])
+    return out
+
+
+@profiled()
+def charts_zip(figs: dict) -> bytes:
+    """ZIP with <name>.png (when kaleido works) and <name>.html for every chart in {name: fig}."""
+    try:
+        pngs = _render_pngs(figs) if png_export_available() else {}
+    except Exception:
+        pngs = {}
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, fig in figs.items():
+            if name in pngs:
+                zf.writestr(f"{name}.png", pngs[name])
+            zf.writestr(f"{name}.html", chart_html(fig))
+    return buf.getvalue()
+
+
+def _png_or_none(fig):
+    try:
+        return chart_png(fig)
+    except Exception:
+        return None
+
+
+def register_chart(fig, base_name: str):
+    """Remember a chart shown in this run for export_all_button."""
+    st.session_state.setdefault(_CHARTS_KEY, {})[base_name] = fig
+
+
+def download_buttons(fig, base_name: str, container=None):
+    """PNG/HTML download buttons; nothing is rendered until a button is clicked."""
+    area = container if container is not None else st
+    register_chart(fig, base_name)
+    if DEFERRED_DOWNLOADS:
+        if png_export_available():
+            area.download_button("📥 PNG", data=lambda: chart_png(fig), file_name=f"{base_name}.png",
+                                 mime="image/png", key=f"png_{base_name}", on_click="ignore")
+        else:
+            area.caption("PNG export requires the 'kaleido' package (and Chrome).")
+        area.download_button("📥 HTML", data=lambda: chart_html(fig), file_name=f"{base_name}.html",
+                             mime="text/html", key=f"html_{base_name}", on_click="ignore")
+        return
+    if area.button("🖼️ Prepare downloads", key=f"prep_{base_name}"):
+        png_bytes = _png_or_none(fig)
+        if png_bytes is not None:
+            area.download_button("📥 PNG", data=png_bytes, file_name=f"{base_name}.png", mime="image/png")
+        else:
+            area.caption("PNG export requires the 'kaleido' package (and Chrome). Skipping PNG button.")
+        area.download_button("📥 HTML", data=chart_html(fig), file_name=f"{base_name}.html", mime="text/html")
+
+
+def export_all_button(container=None, label: str = "📦 Export charts (ZIP)"):
+    """
+    One ZIP of every chart registered in this run (the charts of the visible
+    tab), rendered on click. Call after the charts.
+    """
+    area = container if container is not None else st
+    figs = st.session_state.pop(_CHARTS_KEY, {})
+    if not figs:
+        return
+    if DEFERRED_DOWNLOADS:
+        area.download_button(label, data=lambda: charts_zip(figs), file_name="charts.zip",
+                             mime="application/zip", key="zip_charts", on_click="ignore")
+    elif area.button(label, key="prep_zip_charts"):
+        area.download_button("📥 charts.zip", data=charts_zip(figs), file_name="charts.zip",
+                             mime="application/zip")